@@ -0,0 +1,68 @@
+"""Benchmark import scanning over a synthetic corpus.
+
+Compares the serial AST scanner against the process pool (--jobs) and the
+line-based fast scanner (--scanner fast).
+
+Usage:
+    python benchmarks/import_scan.py --files 6000 --jobs 8
+    python benchmarks/import_scan.py --corpus /path/to/site-packages
+"""
+
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from molerat.main import MoleratDistributionResolver
+
+STDLIB = ["os", "sys", "json", "re", "typing", "pathlib", "collections", "functools"]
+THIRD_PARTY = ["toml", "rich", "pydantic", "watchdog"]
+
+
+def build_corpus(root: Path, files: int, seed: int = 0):
+    rng = random.Random(seed)
+    for i in range(files):
+        package = root / f"pkg_{i % 50}"
+        package.mkdir(exist_ok=True)
+        lines = [f"import {name}" for name in rng.sample(STDLIB, 3)]
+        lines += [f"from {name} import *" for name in rng.sample(THIRD_PARTY, 1)]
+        for f in range(20):
+            lines.append(f"\n\ndef func_{f}(a, b):\n    total = [a * x + b for x in range(10)]\n    return sum(total)")
+        (package / f"mod_{i}.py").write_text("\n".join(lines) + "\n")
+
+
+def run(path: Path, **kwargs) -> float:
+    MoleratDistributionResolver._import_cache.clear()
+    start = time.perf_counter()
+    MoleratDistributionResolver(str(path), **kwargs).resolve()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=6000)
+    parser.add_argument("--jobs", type=int, default=0)
+    parser.add_argument("--corpus", type=Path, help="scan an existing tree instead of a synthetic one")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = args.corpus or Path(tmp)
+        if not args.corpus:
+            build_corpus(root, args.files)
+        MoleratDistributionResolver._get_index()
+
+        print(f"{sum(1 for _ in root.rglob('*.py'))} files in {root}")
+        serial = run(root)
+        print(f"ast serial:        {serial:.3f}s")
+        for label, kwargs in (
+            (f"ast jobs={args.jobs or 'all'}", {"jobs": args.jobs}),
+            ("fast serial", {"scanner": "fast"}),
+            (f"fast jobs={args.jobs or 'all'}", {"jobs": args.jobs, "scanner": "fast"}),
+        ):
+            elapsed = run(root, **kwargs)
+            print(f"{label + ':':<18} {elapsed:.3f}s ({serial / elapsed:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
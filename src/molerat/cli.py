@@ -5,7 +5,16 @@ import os
 from rich.console import Console
 from rich.panel import Panel
 from rich.table import Table
-from molerat.main import MoleRatFileSync
+from molerat.main import (
+    DEFAULT_BURST_THRESHOLD,
+    DEFAULT_POLL_INTERVAL,
+    DEFAULT_WORK_QUEUE_SIZE,
+    DEFAULT_WORKERS,
+    SCANNER_AST,
+    SCANNERS,
+    UV_LOCK_FILE,
+    MoleRatFileSync,
+)
 from molerat.config import MoleRatConfig, Sync, Destination
 
 console = Console()
@@ -24,6 +33,15 @@ def print_help():
         "  [yellow]--exclude[/yellow]       Exclude pattern for files/dirs (can be specified multiple times, applies to corresponding --watch)\n"
         "  [yellow]--config[/yellow]        Path to molerat.json config file (optional)\n"
         "  [yellow]--no-watch[/yellow]      Copies the contents of source to directory once and exits\n"
+        "  [yellow]-j, --jobs[/yellow]      Processes used to parse files during dependency promotion (default 1, 0 = all CPUs)\n"
+        "  [yellow]--scanner[/yellow]       Import scanner: 'ast' (full parse, default) or 'fast' (parses only import lines)\n"
+        "  [yellow]--write-delay[/yellow]   Seconds to coalesce pyproject.toml updates in watch mode (default 0.5)\n"
+        "  [yellow]--lockfile[/yellow]      Pin undeclared sub-dependencies from a uv.lock instead of installed packages (default path: uv.lock)\n"
+        "  [yellow]--debounce[/yellow]      Seconds a watched folder must be quiet before a batch of changes is synced (default 0.2)\n"
+        "  [yellow]--workers[/yellow]       Threads syncing changed files in watch mode; 0 syncs on the watcher thread (default 4)\n"
+        "  [yellow]--queue-size[/yellow]    Maximum number of file syncs queued for the workers (default 256)\n"
+        "  [yellow]--burst-threshold[/yellow] Pending changes in a watched folder before switching to a full resync (default 1000)\n"
+        "  [yellow]--poll[/yellow]          Poll for changes every N seconds instead of using native file events (default 1.0), for Docker bind mounts and network filesystems\n"
         "  [yellow]-h, --help[/yellow]      Show this help message and exit\n"
         "\n[dim]If no CLI options are provided, molerat will look for a molerat.json config file in the current directory.[/dim]\n"
         "\n[dim]The --exclude option allows you to specify patterns (e.g. --exclude __pycache__) to ignore during sync.[/dim]\n"
@@ -70,6 +88,73 @@ def parse_args():
         help="copy to destination. do not watch and sync",
     )
 
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="processes used to parse files during dependency promotion (0 = all CPUs)",
+    )
+
+    parser.add_argument(
+        "--scanner",
+        choices=SCANNERS,
+        default=SCANNER_AST,
+        help="import scanner used during dependency promotion",
+    )
+
+    parser.add_argument(
+        "--write-delay",
+        type=float,
+        default=0.5,
+        help="seconds to coalesce pyproject.toml updates in watch mode",
+    )
+
+    parser.add_argument(
+        "--lockfile",
+        nargs="?",
+        const=UV_LOCK_FILE,
+        default=None,
+        help="pin undeclared sub-dependency versions from this uv.lock",
+    )
+
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=0.2,
+        help="seconds a watched folder must be quiet before a batch of changes is synced",
+    )
+
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help="threads syncing changed files in watch mode (0 = sync on the watcher thread)",
+    )
+
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=DEFAULT_WORK_QUEUE_SIZE,
+        help="maximum number of file syncs queued for the workers",
+    )
+
+    parser.add_argument(
+        "--burst-threshold",
+        type=int,
+        default=DEFAULT_BURST_THRESHOLD,
+        help="pending changes in a watched folder before switching to a full resync",
+    )
+
+    parser.add_argument(
+        "--poll",
+        nargs="?",
+        type=float,
+        const=DEFAULT_POLL_INTERVAL,
+        default=None,
+        help="poll for changes every N seconds instead of using native file events",
+    )
+
     parser.add_argument("-h", "--help", action="store_true", help="Show help and exit")
     return parser.parse_args()
 
@@ -89,7 +174,19 @@ def main():
 
     # 1. If --config is provided, use it
     if args.config:
-        sync = MoleRatFileSync(config_path=args.config, no_watch=no_watch)
+        sync = MoleRatFileSync(
+            config_path=args.config,
+            no_watch=no_watch,
+            jobs=args.jobs,
+            scanner=args.scanner,
+            write_delay=args.write_delay,
+            lockfile=args.lockfile,
+            debounce=args.debounce,
+            workers=args.workers,
+            queue_size=args.queue_size,
+            burst_threshold=args.burst_threshold,
+            poll_interval=args.poll,
+        )
         sync.run()
         return
 
@@ -97,7 +194,19 @@ def main():
     if not any([args.watch, args.destination, args.entrypoint]) and os.path.exists(
         DEFAULT_CONFIG_PATH
     ):
-        sync = MoleRatFileSync(config_path=DEFAULT_CONFIG_PATH, no_watch=no_watch)
+        sync = MoleRatFileSync(
+            config_path=DEFAULT_CONFIG_PATH,
+            no_watch=no_watch,
+            jobs=args.jobs,
+            scanner=args.scanner,
+            write_delay=args.write_delay,
+            lockfile=args.lockfile,
+            debounce=args.debounce,
+            workers=args.workers,
+            queue_size=args.queue_size,
+            burst_threshold=args.burst_threshold,
+            poll_interval=args.poll,
+        )
         sync.run()
         return
 
@@ -138,7 +247,19 @@ def main():
         sync_blocks.append(Sync(watch=watch_dir, exclude=exclude, destinations=dests))
 
     config = MoleRatConfig(sync=sync_blocks)
-    sync = MoleRatFileSync(config=config, no_watch=no_watch)
+    sync = MoleRatFileSync(
+        config=config,
+        no_watch=no_watch,
+        jobs=args.jobs,
+        scanner=args.scanner,
+        write_delay=args.write_delay,
+        lockfile=args.lockfile,
+        debounce=args.debounce,
+        workers=args.workers,
+        queue_size=args.queue_size,
+        burst_threshold=args.burst_threshold,
+        poll_interval=args.poll,
+    )
     sync.run()
 
 
@@ -1,12 +1,21 @@
 import shutil
 import os
+import asyncio
 import json
+import copy
+import hashlib
 import importlib.util
 import ast
 import toml
 import sys
 import re
-from typing import List, Tuple
+import fnmatch
+import functools
+import threading
+import time
+import signal
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, FrozenSet, Iterator, List, Pattern, Sequence, Set, Tuple, Union
 from molerat.config import MoleRatConfig
 from typing import Optional
 from rich.console import Console
@@ -16,6 +25,10 @@ from watchdog.events import (
     FileCreatedEvent,
     FileModifiedEvent,
     FileDeletedEvent,
+    FileMovedEvent,
+    DirCreatedEvent,
+    DirDeletedEvent,
+    DirMovedEvent,
 )
 from watchdog.observers import Observer
 from watchdog.observers.api import BaseObserver
@@ -30,63 +43,921 @@ console = Console()
 DEFAULT_CONFIG_PATH = "molerat.json"
 GITIGNORE_PATH = ".gitignore"
 PYPROJECT_TOML_FILE = "pyproject.toml"
+SUPERVISOR_INTERVAL = 1.0  # seconds between observer health checks in watch mode
+DEFAULT_WORKERS = 4
+DEFAULT_WORK_QUEUE_SIZE = 256
+DEFAULT_POLL_INTERVAL = 1.0  # seconds between scans of the polling watcher
+DEFAULT_BURST_THRESHOLD = 1000  # pending events per watched folder before switching to a full resync
+EVENT_CREATED = "created"
+EVENT_MODIFIED = "modified"
+EVENT_DELETED = "deleted"
+EVENT_MOVED = "moved"
+EVENT_DIR_CREATED = "dir_created"
+EVENT_DIR_DELETED = "dir_deleted"
+EVENT_DIR_MOVED = "dir_moved"
+UV_LOCK_FILE = "uv.lock"
+MOLERAT_DIR = ".molerat"
+CACHE_DIR = os.path.join(MOLERAT_DIR, "cache")
+RESOLVER_CACHE_FILE = "distribution-index.json"
+PARALLEL_SCAN_THRESHOLD = 64  # below this many unparsed files a process pool costs more than it saves
+SCANNER_AST = "ast"
+SCANNER_FAST = "fast"
+SCANNERS = (SCANNER_AST, SCANNER_FAST)
+MOLERAT_TABLE = "extra-dependencies-detected-by-molerat"
+PROMOTED_KEY = "promoted"  # requirements molerat added to the workspace and may demote again
+SUB_DEPS_KEY = "sub-deps-absent-in-base-pyproject-toml"
+PRUNED_DIRS = ("__pycache__", "node_modules", "site-packages")  # never hold first-party imports
+
+_IMPORT_LINE = re.compile(r"^[ \t]*(?:import|from)[ \t\\(]", re.MULTILINE)
+_INLINE_IMPORT = re.compile(r"[;:][ \t]*(?:import|from)[ \t\\(]")
+_REQUIREMENT_NAME = re.compile(r"^\s*([A-Za-z0-9](?:[A-Za-z0-9._-]*[A-Za-z0-9])?)")
+_NAME_SEPARATORS = re.compile(r"[-_.]+")
+_STRING_OR_COMMENT = re.compile(
+    r"""#[^\n]*|\"\"\"|'''|"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*'"""
+)
+
+
+def normalize_name(name: str) -> str:
+    """Normalize a distribution name as specified by PEP 503."""
+    return _NAME_SEPARATORS.sub("-", name).lower()
+
+
+def compile_exclude_patterns(patterns: Optional[List[str]]) -> Optional[Pattern]:
+    """Compile shutil.ignore_patterns-style glob patterns into a single name-matching regex."""
+    if not patterns:
+        return None
+    return re.compile("|".join(fnmatch.translate(pattern) for pattern in patterns))
+
+
+def reconcile_directory(
+    source_dir: str, target_dir: str, exclude: Optional[Pattern] = None
+) -> Tuple[int, int]:
+    """Make target_dir mirror source_dir, copying only missing or changed files and removing stale ones.
+
+    A file counts as changed when its size differs or the source was modified after the
+    target was written. Names matching exclude are neither copied nor removed.
+    Returns the number of (copied, removed) entries.
+    """
+    copied = removed = 0
+    pending = [""]
+    while pending:
+        relative_dir = pending.pop()
+        source = os.path.join(source_dir, relative_dir)
+        target = os.path.join(target_dir, relative_dir)
+        os.makedirs(target, exist_ok=True)
+        try:
+            with os.scandir(source) as entries:
+                source_entries = {
+                    entry.name: entry
+                    for entry in entries
+                    if not (exclude and exclude.match(entry.name))
+                }
+            with os.scandir(target) as entries:
+                target_entries = [
+                    entry for entry in entries if not (exclude and exclude.match(entry.name))
+                ]
+        except OSError:
+            continue  # removed while reconciling
+
+        for entry in target_entries:
+            source_entry = source_entries.get(entry.name)
+            if source_entry is not None and source_entry.is_dir() == entry.is_dir(
+                follow_symlinks=False
+            ):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path)
+            else:
+                os.remove(entry.path)
+            removed += 1
+
+        for name, entry in source_entries.items():
+            if entry.is_dir():
+                pending.append(os.path.join(relative_dir, name))
+                continue
+            target_path = os.path.join(target, name)
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue  # dangling symlink
+            try:
+                target_stat = os.stat(target_path)
+            except FileNotFoundError:
+                target_stat = None
+            if (
+                target_stat is None
+                or target_stat.st_size != stat.st_size
+                or target_stat.st_mtime_ns < stat.st_mtime_ns
+            ):
+                shutil.copy(entry.path, target_path)
+                copied += 1
+
+    return copied, removed
+
+
+def ensure_cache_dir() -> str:
+    """Create the .molerat/cache directory, keeping it out of version control."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    gitignore = os.path.join(MOLERAT_DIR, GITIGNORE_PATH)
+    if not os.path.exists(gitignore):
+        with open(gitignore, "w", encoding="utf-8") as f:
+            f.write("# created by molerat\n*\n")
+    return CACHE_DIR
+
+
+class MoleratWorkPool:
+    """Run file syncs on a bounded thread pool and promotions single-flight per destination."""
+
+    __slots__ = ("_executor", "_promotion_executor", "_slots", "_lock", "_promoting")
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, queue_size: int = DEFAULT_WORK_QUEUE_SIZE):
+        """submit() blocks once queue_size tasks are queued or running."""
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="molerat-sync")
+        self._promotion_executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="molerat-promote"
+        )
+        self._slots = threading.BoundedSemaphore(queue_size)
+        self._lock = threading.Lock()
+        # {destination: promotion to run after the current one, or None}
+        self._promoting: Dict[str, Optional[Callable[[], None]]] = {}
+
+    def submit(self, fn: Callable, *args) -> Future:
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def promote(self, destination: str, fn: Callable[[], None]):
+        """Run fn for destination, or once more after the promotion already running for it."""
+        with self._lock:
+            if destination in self._promoting:
+                self._promoting[destination] = fn
+                return
+            self._promoting[destination] = None
+        self._promotion_executor.submit(self._run_promotions, destination, fn)
+
+    def _run_promotions(self, destination: str, fn: Optional[Callable[[], None]]):
+        while fn:
+            try:
+                fn()
+            except Exception as e:
+                console.log(f"[red][Error][/red] failed to promote dependencies of {destination}: {e!r}")
+            with self._lock:
+                fn = self._promoting[destination]
+                if fn:
+                    self._promoting[destination] = None
+                else:
+                    del self._promoting[destination]
+
+    def shutdown(self):
+        """Wait for queued syncs and promotions to finish."""
+        self._executor.shutdown(wait=True)
+        self._promotion_executor.shutdown(wait=True)
+
+
+class MoleratEventQueue:
+    """Coalesce bursts of file events per path and hand them over as one batch after a quiet period.
+
+    When more than burst_threshold events are pending, they are dropped along with every
+    event until the next quiet period, and reconcile is called once instead.
+    """
+
+    __slots__ = (
+        "debounce",
+        "process",
+        "reconcile",
+        "burst_threshold",
+        "counters",
+        "_pending",
+        "_operations",
+        "_burst",
+        "_last_event",
+        "_stopping",
+        "_wakeup",
+        "_thread",
+    )
+
+    def __init__(
+        self,
+        process: Callable[[Dict[str, str], List[Tuple[str, str, Optional[str]]]], None],
+        debounce: float = 0.2,
+        reconcile: Optional[Callable[[], None]] = None,
+        burst_threshold: int = DEFAULT_BURST_THRESHOLD,
+        poll_interval: Optional[float] = None,
+    ):
+        """process is called once no event arrived for debounce seconds.
+
+        It receives {src_path: EVENT_*} of file events and the ordered move and directory
+        operations [(EVENT_*, src_path, dest_path)], which must be applied first.
+        """
+        self.debounce = debounce
+        self.process = process
+        self.reconcile = reconcile
+        self.burst_threshold = burst_threshold
+        self.poll_interval = poll_interval
+        self.counters = {
+            "events": 0,  # events received
+            "batches": 0,  # batches handed to process
+            "bursts": 0,  # switches to bulk resync mode
+            "dropped": 0,  # events discarded in favour of a resync
+            "max_depth": 0,  # most events pending at once
+        }
+        self._pending: Dict[str, Tuple[str, str]] = {}  # {src_path: (first_event, last_event)}
+        self._operations: List[Tuple[str, str, Optional[str]]] = []
+        self._burst = False
+        self._last_event = 0.0
+        self._stopping = False
+        self._wakeup = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def depth(self) -> int:
+        """Number of events currently waiting for the next batch."""
+        return len(self._pending) + len(self._operations)
+
+    def _record_event(self) -> bool:
+        """Count an incoming event. Returns False if it is swallowed by a burst."""
+        self.counters["events"] += 1
+        self._last_event = time.monotonic()
+        self._wakeup.notify()
+        if self._burst:
+            self.counters["dropped"] += 1
+            return False
+        return True
+
+    def _check_burst(self):
+        depth = self.depth
+        self.counters["max_depth"] = max(self.counters["max_depth"], depth)
+        if self.reconcile is None or depth <= self.burst_threshold:
+            return
+        console.log(
+            f"[yellow][Burst][/yellow] more than {self.burst_threshold} pending changes. switching to a full resync"
+        )
+        self.counters["bursts"] += 1
+        self.counters["dropped"] += depth
+        self._pending.clear()
+        self._operations.clear()
+        self._burst = True
+
+    def put(self, src_path: str, event_type: str):
+        """Record an event, collapsing it with earlier events for the same path."""
+        with self._wakeup:
+            if not self._record_event():
+                return
+            first, _ = self._pending.get(src_path, (event_type, None))
+            if first == EVENT_CREATED and event_type == EVENT_DELETED:
+                # created and removed again within the window: nothing to sync
+                self._pending.pop(src_path, None)
+            else:
+                self._pending[src_path] = (first, event_type)
+            self._check_burst()
+
+    def put_operation(self, event_type: str, src_path: str, dest_path: Optional[str] = None):
+        """Record a move or directory event, rewriting pending file events it affects."""
+        with self._wakeup:
+            if not self._record_event():
+                return
+            if event_type == EVENT_DIR_DELETED:
+                for path in self._paths_under(src_path):
+                    first, _ = self._pending.pop(path)
+                    if first != EVENT_CREATED:
+                        self._pending[path] = (first, EVENT_DELETED)
+            elif event_type in (EVENT_MOVED, EVENT_DIR_MOVED):
+                # the move replaces whatever was at dest_path, and pending changes move along
+                for path in self._paths_under(dest_path):
+                    del self._pending[path]
+                for path in self._paths_under(src_path):
+                    self._pending[dest_path + path[len(src_path) :]] = self._pending.pop(path)
+            self._operations.append((event_type, src_path, dest_path))
+            self._check_burst()
+
+    def _paths_under(self, path: str) -> List[str]:
+        prefix = os.path.join(path, "")
+        return [pending for pending in self._pending if pending == path or pending.startswith(prefix)]
+
+    @staticmethod
+    def _collapse(first: str, last: str) -> str:
+        if last == EVENT_DELETED:
+            return EVENT_DELETED
+        if first == EVENT_CREATED:
+            return EVENT_CREATED
+        return EVENT_MODIFIED
+
+    def start(self):
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="molerat-event-queue", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Process whatever is still pending and stop the dispatcher thread."""
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify()
+        if self._thread:
+            self._thread.join()
+
+    def is_alive(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+
+    def _run(self):
+        while True:
+            with self._wakeup:
+                while not self.depth and not self._burst and not self._stopping:
+                    self._wakeup.wait()
+                while not self._stopping:
+                    quiet_for = time.monotonic() - self._last_event
+                    if quiet_for >= self.debounce:
+                        break
+                    self._wakeup.wait(self.debounce - quiet_for)
+                if not self.depth and not self._burst:
+                    return
+            self.dispatch()
+
+    def dispatch(self) -> bool:
+        """Hand everything pending to process, or to reconcile after a burst. Returns False if idle.
+
+        The dispatcher thread calls this after each quiet period; without a started thread the
+        owner decides when to call it.
+        """
+        with self._wakeup:
+            burst, self._burst = self._burst, False
+            pending, self._pending = self._pending, {}
+            operations, self._operations = self._operations, []
+
+        if burst:
+            try:
+                self.reconcile()
+            except Exception as e:
+                console.log(f"[red][Error][/red] failed to resync after a burst of changes: {e!r}")
+            return True
+        if not pending and not operations:
+            return False
+
+        self.counters["batches"] += 1
+        batch = {path: self._collapse(*events) for path, events in pending.items()}
+        try:
+            self.process(batch, operations)
+        except Exception as e:
+            console.log(f"[red][Error][/red] failed to sync {len(batch)} changed file(s): {e!r}")
+        return True
 
 
 class MoleRatFileChangeHanlder(FileSystemEventHandler):
-    __slots__ = ("source_dir", "destination", "directory", "destination_dir")
+    """Sync the events of one watched folder to every destination it is configured for."""
+
+    __slots__ = (
+        "source_dir",
+        "destinations",
+        "scanner",
+        "exclude_patterns",
+        "exclude",
+        "queue",
+        "inline",
+        "pool",
+        "_imports",
+    )
 
-    def __init__(self, source_dir: str, destination: str, directory: str):
+    def __init__(
+        self,
+        source_dir: str,
+        destinations: List[Tuple[str, str]],
+        scanner: str = SCANNER_AST,
+        debounce: float = 0.0,
+        pool: Optional[MoleratWorkPool] = None,
+        exclude: Optional[List[str]] = None,
+        burst_threshold: int = DEFAULT_BURST_THRESHOLD,
+        inline: Optional[bool] = None,
+    ):
+        """destinations holds (destination project, directory inside it to sync into) pairs.
+
+        With debounce > 0, events are coalesced per path and synced in batches once the
+        folder was quiet for that many seconds. Call start() and stop() around watching.
+        With a pool, the files of a batch are synced concurrently and promotions run on it.
+        Events for paths with a component matching an exclude pattern are dropped.
+        More than burst_threshold pending events trigger one reconcile() instead.
+        inline (default: debounce <= 0) syncs every event right away on the observer thread;
+        with inline=False and no start(), the owner calls queue.dispatch() itself.
+        """
         self.source_dir = source_dir
-        self.destination = destination
-        self.directory = directory
-        self.destination_dir = os.path.join(destination, directory)
+        self.destinations = [
+            (destination, os.path.join(destination, directory))
+            for destination, directory in destinations
+        ]
+        self.scanner = scanner
+        self.exclude_patterns = exclude or []
+        self.exclude = compile_exclude_patterns(exclude)
+        self.queue = MoleratEventQueue(self.process_batch, debounce, self.reconcile, burst_threshold)
+        self.inline = debounce <= 0 if inline is None else inline
+        self.pool = pool
+        self._imports: Dict[str, FrozenSet[str]] = {}  # {src_path: imports when it was last resolved}
+
+    def start(self):
+        """Start the dispatcher thread that syncs a batch after each quiet period."""
+        if not self.inline:
+            self.queue.start()
+
+    def stop(self):
+        """Sync what is still pending and stop the dispatcher thread."""
+        self.queue.stop()
+        self.queue.dispatch()
+
+    def _excluded(self, path: str) -> bool:
+        """Whether any component of path below the watched folder matches an exclude pattern."""
+        if not self.exclude:
+            return False
+        relative_path = path[len(self.source_dir) + 1 :]
+        return any(self.exclude.match(name) for name in relative_path.split(os.path.sep))
 
     def on_any_event(self, event):
-        relative_file_path = event.src_path[len(self.source_dir) + 1 :]
-        destination_path = self.destination_dir + os.path.sep + relative_file_path
-        if isinstance(event, FileCreatedEvent) or isinstance(event, FileModifiedEvent):
-            if isinstance(event, FileCreatedEvent):
-                console.log(
-                    f"[green][File Created][/green] copying {event.src_path} to {destination_path}"
-                )
-            elif isinstance(event, FileModifiedEvent):
-                console.log(
-                    f"[yellow][File Modified][/yellow] syncing {event.src_path} to {destination_path}"
-                )
-            shutil.copy(event.src_path, destination_path)
+        if isinstance(event, (FileMovedEvent, DirMovedEvent)):
+            if event.is_synthetic:
+                return  # already covered by the move of its parent directory
+            src_excluded = self._excluded(event.src_path)
+            dest_excluded = self._excluded(event.dest_path)
+            if src_excluded and dest_excluded:
+                return
+            if dest_excluded:  # moved out of the synced files
+                if event.is_directory:
+                    self._put_operation(EVENT_DIR_DELETED, event.src_path)
+                else:
+                    self._put(event.src_path, EVENT_DELETED)
+            elif src_excluded:  # moved into the synced files
+                if event.is_directory:
+                    self._put_tree(event.dest_path)
+                else:
+                    self._put(event.dest_path, EVENT_CREATED)
+            else:
+                event_type = EVENT_DIR_MOVED if event.is_directory else EVENT_MOVED
+                self._put_operation(event_type, event.src_path, event.dest_path)
+            return
+        if self._excluded(event.src_path):
+            return
+        if isinstance(event, DirCreatedEvent):
+            self._put_operation(EVENT_DIR_CREATED, event.src_path)
+            return
+        if isinstance(event, DirDeletedEvent):
+            self._put_operation(EVENT_DIR_DELETED, event.src_path)
+            return
 
-            console.log("[blue][Info][/blue] analyzing affected dependencies")
-            MoleratDistributionSync.promote_dependencies(
-                event.src_path, self.destination, is_directory=False
+        if isinstance(event, FileCreatedEvent):
+            event_type = EVENT_CREATED
+        elif isinstance(event, FileModifiedEvent):
+            event_type = EVENT_MODIFIED
+        elif isinstance(event, FileDeletedEvent):
+            event_type = EVENT_DELETED
+        else:
+            return
+        self._put(event.src_path, event_type)
+
+    def _put(self, src_path: str, event_type: str):
+        self.queue.put(src_path, event_type)
+        if self.inline:
+            self.queue.dispatch()
+
+    def _put_tree(self, directory: str):
+        """Queue a directory and its files that are not excluded as newly created."""
+        for root, dirs, files in os.walk(directory):
+            if self.exclude:
+                dirs[:] = [name for name in dirs if not self.exclude.match(name)]
+                files = [name for name in files if not self.exclude.match(name)]
+            self._put_operation(EVENT_DIR_CREATED, root)
+            for name in files:
+                self._put(os.path.join(root, name), EVENT_CREATED)
+
+    def _put_operation(self, event_type: str, src_path: str, dest_path: Optional[str] = None):
+        self.queue.put_operation(event_type, src_path, dest_path)
+        if self.inline:
+            self.queue.dispatch()
+
+    def _apply_operation(self, event_type: str, src_path: str, dest_path: Optional[str]):
+        """Mirror a move or directory event at every destination."""
+        relative_src_path = src_path[len(self.source_dir) + 1 :]
+        if event_type == EVENT_DIR_CREATED:
+            console.log(
+                f"[green][Directory Created][/green] creating {src_path} in {len(self.destinations)} destination(s)"
+            )
+        elif event_type == EVENT_DIR_DELETED:
+            console.log(
+                f"[red][Directory Deleted][/red] {src_path}. deleting it from {len(self.destinations)} destination(s)"
+            )
+        else:
+            console.log(
+                f"[magenta][Moved][/magenta] renaming {src_path} to {dest_path} in {len(self.destinations)} destination(s)"
             )
 
-        elif isinstance(event, FileDeletedEvent):
+        for _, destination_dir in self.destinations:
+            target = os.path.join(destination_dir, relative_src_path)
+            if event_type == EVENT_DIR_CREATED:
+                os.makedirs(target, exist_ok=True)
+                continue
+            if event_type == EVENT_DIR_DELETED:
+                if os.path.isdir(target):
+                    shutil.rmtree(target)
+                continue
+
+            new_target = os.path.join(destination_dir, dest_path[len(self.source_dir) + 1 :])
+            os.makedirs(os.path.dirname(new_target), exist_ok=True)
+            if event_type == EVENT_DIR_MOVED and os.path.isdir(new_target):
+                shutil.rmtree(new_target)
+            if os.path.lexists(target):
+                os.replace(target, new_target)
+            elif event_type == EVENT_DIR_MOVED and os.path.isdir(dest_path):
+                # the destination had drifted, copy instead
+                shutil.copytree(
+                    dest_path, new_target, ignore=shutil.ignore_patterns(*self.exclude_patterns)
+                )
+            elif event_type == EVENT_MOVED and os.path.isfile(dest_path):
+                shutil.copy(dest_path, new_target)
+
+    def _sync_file(self, src_path: str, event_type: str) -> Optional[FrozenSet[str]]:
+        """Mirror one event to every destination and return the distributions the file now uses.
+
+        Returns None when the dependencies cannot have changed: for files other than .py and
+        for .py files whose imports are the same as when they were last resolved.
+        """
+        is_python = src_path.endswith(".py")
+        relative_file_path = src_path[len(self.source_dir) + 1 :]
+        if event_type == EVENT_DELETED:
+            console.log(
+                f"[red][File Deleted][/red] {src_path}. deleting it from {len(self.destinations)} destination(s)"
+            )
+            for _, destination_dir in self.destinations:
+                destination_path = os.path.join(destination_dir, relative_file_path)
+                if os.path.exists(destination_path):
+                    os.remove(destination_path)
+            if not is_python:
+                return None
+            self._imports.pop(src_path, None)
+            MoleratDistributionResolver.forget_file(src_path)
+            return frozenset()
+
+        if event_type == EVENT_CREATED:
+            console.log(
+                f"[green][File Created][/green] copying {src_path} to {len(self.destinations)} destination(s)"
+            )
+        else:
+            console.log(
+                f"[yellow][File Modified][/yellow] syncing {src_path} to {len(self.destinations)} destination(s)"
+            )
+        for _, destination_dir in self.destinations:
+            shutil.copy(src_path, os.path.join(destination_dir, relative_file_path))
+        if not is_python:
+            return None
+
+        # most saves only touch function bodies: one import scan decides if anything is resolved
+        imports = MoleratDistributionResolver.file_imports(Path(src_path).resolve(), self.scanner)
+        if self._imports.get(src_path) == imports:
+            console.log(f"[blue][Info][/blue] imports of {src_path} are unchanged")
+            return None
+        dists = MoleratDistributionSync.file_distributions(src_path, self.scanner)
+        self._imports[src_path] = imports
+        return dists
+
+    def reconcile(self):
+        """Bring every destination in line with the watched folder and promote each one once.
+
+        Used instead of replaying individual events after a burst such as a git checkout.
+        """
+        console.log(
+            f"[yellow][Resync][/yellow] reconciling {self.source_dir} with {len(self.destinations)} destination(s)"
+        )
+        for _, destination_dir in self.destinations:
+            copied, removed = reconcile_directory(self.source_dir, destination_dir, self.exclude)
             console.log(
-                f"[red][File Deleted][/red] {event.src_path}. deleting file at destination: {destination_path}"
+                f"[green][Resync][/green] {destination_dir}: {copied} file(s) copied, {removed} removed"
             )
-            os.remove(destination_path)
+
+        self._imports.clear()
+        file_deps = MoleratDistributionSync.resolve_file_dependencies(
+            self.source_dir, scanner=self.scanner, exclude=self.exclude_patterns
+        )
+        source = str(Path(self.source_dir).resolve())
+        for destination, _ in self.destinations:
+            ledger = MoleratDistributionSync.ledger_for(destination)
+            with ledger.lock:
+                changed = ledger.replace_source(source, file_deps)
+            if not changed:
+                continue
+            if self.pool:
+                self.pool.promote(
+                    os.path.abspath(destination),
+                    functools.partial(
+                        MoleratDistributionSync.promote_ledger, self.source_dir, destination
+                    ),
+                )
+            else:
+                MoleratDistributionSync.promote_ledger(self.source_dir, destination)
+
+    def _move_imports(self, src_path: str, dest_path: Optional[str]):
+        """Carry the known imports of a moved file or tree over to its new path, or drop them."""
+        prefix = os.path.join(src_path, "")
+        for path in [path for path in self._imports if path == src_path or path.startswith(prefix)]:
+            imports = self._imports.pop(path)
+            if dest_path:
+                self._imports[dest_path + path[len(src_path) :]] = imports
+
+    def process_batch(
+        self,
+        batch: Dict[str, str],
+        operations: Sequence[Tuple[str, str, Optional[str]]] = (),
+    ):
+        """Sync a batch of {src_path: EVENT_*} to every destination, then promote once per destination.
+
+        Move and directory operations are applied first, in order. A batch holds each path
+        once and the next batch starts only after this one's files are synced, so events of
+        one path are always applied in order.
+        """
+        file_dists: Dict[str, FrozenSet[str]] = {}
+        moved: List[Tuple[str, str]] = []
+        removed_dirs: List[str] = []
+        for event_type, src_path, dest_path in operations:
+            try:
+                self._apply_operation(event_type, src_path, dest_path)
+            except OSError as e:
+                console.log(f"[red][Error][/red] failed to sync {src_path}: {e!r}")
+                continue
+
+            if event_type == EVENT_DIR_DELETED:
+                MoleratDistributionResolver.forget_tree(src_path)
+                self._move_imports(src_path, None)
+                removed_dirs.append(src_path)
+            elif event_type == EVENT_DIR_MOVED:
+                MoleratDistributionResolver.forget_tree(src_path)
+                self._move_imports(src_path, dest_path)
+                moved.append((src_path, dest_path))
+            elif event_type == EVENT_MOVED:
+                MoleratDistributionResolver.forget_file(src_path)
+                self._move_imports(src_path, dest_path if dest_path.endswith(".py") else None)
+                # a rename keeps the imports, so only a change of the .py file set needs resolving
+                if src_path.endswith(".py") and dest_path.endswith(".py"):
+                    moved.append((src_path, dest_path))
+                elif src_path.endswith(".py"):
+                    file_dists[src_path] = frozenset()
+                elif dest_path.endswith(".py"):
+                    batch = {**batch, dest_path: batch.get(dest_path, EVENT_MODIFIED)}
+
+        if self.pool:
+            futures = {
+                src_path: self.pool.submit(self._sync_file, src_path, event_type)
+                for src_path, event_type in batch.items()
+            }
+            for src_path, future in futures.items():
+                try:
+                    dists = future.result()
+                except Exception as e:
+                    console.log(f"[red][Error][/red] failed to sync {src_path}: {e!r}")
+                    continue
+                if dists is not None:
+                    file_dists[src_path] = dists
+        else:
+            for src_path, event_type in batch.items():
+                dists = self._sync_file(src_path, event_type)
+                if dists is not None:
+                    file_dists[src_path] = dists
+
+        if not file_dists and not moved and not removed_dirs:
+            return
+
+        for destination, _ in self.destinations:
+            if not self.pool:
+                MoleratDistributionSync.update_batch_dependencies(
+                    file_dists,
+                    destination,
+                    source=self.source_dir,
+                    moved=moved,
+                    removed_dirs=removed_dirs,
+                )
+            elif MoleratDistributionSync.update_batch_dependencies(
+                file_dists,
+                destination,
+                source=self.source_dir,
+                promote=False,
+                moved=moved,
+                removed_dirs=removed_dirs,
+            ):
+                self.pool.promote(
+                    os.path.abspath(destination),
+                    functools.partial(
+                        MoleratDistributionSync.promote_ledger, self.source_dir, destination
+                    ),
+                )
+
+
+class MoleratAsyncEventBridge(FileSystemEventHandler):
+    """Forward the events of an observer thread into an asyncio.Queue owned by a running loop."""
+
+    __slots__ = ("loop", "events", "handler")
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        events: asyncio.Queue,
+        handler: MoleRatFileChangeHanlder,
+    ):
+        self.loop = loop
+        self.events = events
+        self.handler = handler
+
+    def on_any_event(self, event: FileSystemEvent):
+        try:
+            self.loop.call_soon_threadsafe(self.events.put_nowait, (self.handler, event))
+        except RuntimeError:
+            pass  # the loop is closed; the engine is shutting down
+
+
+class MoleratPollingObserver(threading.Thread):
+    """Watch a folder by comparing os.scandir snapshots, for filesystems where inotify events never arrive.
+
+    Each scan stats every file, but a directory is only listed again when its own mtime
+    changed, since adding, removing or renaming entries is what updates it. The differences
+    are dispatched to the handlers as the same watchdog events the native observer emits,
+    with renames detected by inode.
+    """
+
+    def __init__(
+        self,
+        event_handlers: Sequence[FileSystemEventHandler],
+        path: str,
+        interval: float = DEFAULT_POLL_INTERVAL,
+    ):
+        super().__init__(name=f"molerat-poll:{path}", daemon=True)
+        self.event_handlers = list(event_handlers)
+        self.path = path
+        self.interval = interval
+        self._stopped = threading.Event()
+        # {dir_path: (mtime_ns, file names, subdirectory names)}
+        self._listings: Dict[str, Tuple[int, List[str], List[str]]] = {}
+        # {path: (inode, size, mtime_ns, is_dir)}
+        self._snapshot: Dict[str, Tuple[int, int, int, bool]] = {}
+
+    def start(self):
+        """Take the reference snapshot, then poll on the thread every interval seconds."""
+        self._snapshot = self._scan()
+        super().start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self.poll()
+
+    def poll(self) -> int:
+        """Scan once and dispatch an event for every difference. Returns the number of events."""
+        snapshot = self._scan()
+        events = self._diff(self._snapshot, snapshot)
+        self._snapshot = snapshot
+        for event in events:
+            for event_handler in self.event_handlers:
+                event_handler.dispatch(event)
+        return len(events)
+
+    def _scan(self) -> Dict[str, Tuple[int, int, int, bool]]:
+        snapshot: Dict[str, Tuple[int, int, int, bool]] = {}
+        listings: Dict[str, Tuple[int, List[str], List[str]]] = {}
+        pending = [self.path]
+        while pending:
+            directory = pending.pop()
+            try:
+                dir_stat = os.stat(directory)
+            except OSError:
+                continue
+            listing = self._listings.get(directory)
+            if listing is None or listing[0] != dir_stat.st_mtime_ns:
+                files: List[str] = []
+                subdirs: List[str] = []
+                try:
+                    with os.scandir(directory) as entries:
+                        for entry in entries:
+                            (subdirs if entry.is_dir(follow_symlinks=False) else files).append(entry.name)
+                except OSError:
+                    continue
+                listing = (dir_stat.st_mtime_ns, files, subdirs)
+            listings[directory] = listing
+
+            if directory != self.path:
+                snapshot[directory] = (dir_stat.st_ino, 0, 0, True)
+            for name in listing[1]:
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue  # removed since the listing, or a dangling symlink
+                snapshot[path] = (stat.st_ino, stat.st_size, stat.st_mtime_ns, False)
+            pending.extend(os.path.join(directory, name) for name in listing[2])
+
+        self._listings = listings
+        return snapshot
+
+    @staticmethod
+    def _diff(
+        old: Dict[str, Tuple[int, int, int, bool]], new: Dict[str, Tuple[int, int, int, bool]]
+    ) -> List[FileSystemEvent]:
+        deleted = set(old) - set(new)
+        created = set(new) - set(old)
+
+        # a rename keeps the inode, and for files the size and mtime as well
+        moved_from = {old[path] if not old[path][3] else (old[path][0], True): path for path in deleted}
+        moves: List[Tuple[str, str]] = []
+        for path in sorted(created):
+            src_path = moved_from.pop(new[path] if not new[path][3] else (new[path][0], True), None)
+            if src_path is not None:
+                moves.append((src_path, path))
+
+        events: List[FileSystemEvent] = []
+        modified: List[str] = []
+        moved_dirs: List[Tuple[str, str]] = []
+        for src_path, dest_path in moves:
+            deleted.discard(src_path)
+            created.discard(dest_path)
+            if any(src_path.startswith(os.path.join(old_dir, "")) for old_dir, _ in moved_dirs):
+                continue  # part of a directory that moved with it
+            if new[dest_path][3]:
+                moved_dirs.append((src_path, dest_path))
+                events.append(DirMovedEvent(src_path, dest_path))
+            else:
+                events.append(FileMovedEvent(src_path, dest_path))
+
+        # entries of moved directories are covered by the directory move
+        for old_dir, new_dir in moved_dirs:
+            old_prefix, new_prefix = os.path.join(old_dir, ""), os.path.join(new_dir, "")
+            for path in [path for path in deleted if path.startswith(old_prefix)]:
+                moved_path = new_prefix + path[len(old_prefix) :]
+                if moved_path in created:
+                    deleted.discard(path)
+                    created.discard(moved_path)
+                    if not new[moved_path][3] and new[moved_path] != old[path]:
+                        modified.append(moved_path)
+
+        for path in sorted(created):
+            events.append(DirCreatedEvent(path) if new[path][3] else FileCreatedEvent(path))
+        for path, stat in new.items():
+            previous = old.get(path)
+            if previous is not None and not stat[3] and previous != stat:
+                modified.append(path)
+        events.extend(FileModifiedEvent(path) for path in modified)
+        for path in sorted(deleted, reverse=True):  # files before the directories holding them
+            events.append(DirDeletedEvent(path) if old[path][3] else FileDeletedEvent(path))
+        return events
 
 
 class MoleratDistributionResolver:
     """Resolve a deduplicated list of installed distributions for packages used in a directory's .py files."""
 
     _cache = {}  # cache {package_name: distribution_name}
-    __slots__ = ("path", "packages", "distributions", "is_directory")
+    _index: Optional[Dict[str, List[str]]] = None  # reverse index {import_name: [distribution_name]}
+    _versions: Dict[str, str] = {}  # {distribution_name: version}, filled alongside the index
+    _index_fingerprint: Optional[str] = None  # environment fingerprint the index was built for
+    _index_lock = threading.Lock()
+    _import_cache: Dict[str, Tuple[int, int, FrozenSet[str]]] = {}  # {file_path: (mtime_ns, size, imports)}
+    __slots__ = (
+        "path",
+        "packages",
+        "file_packages",
+        "distributions",
+        "is_directory",
+        "jobs",
+        "scanner",
+        "exclude",
+    )
 
-    def __init__(self, path: str, is_directory: bool = True):
-        """Initiate with directory path (absolute or relative)."""
+    def __init__(
+        self,
+        path: str,
+        is_directory: bool = True,
+        jobs: int = 1,
+        scanner: str = SCANNER_AST,
+        exclude: Optional[List[str]] = None,
+    ):
+        """Initiate with directory path (absolute or relative). jobs > 1 parses files in a process pool."""
+        if scanner not in SCANNERS:
+            raise ValueError(f"unknown import scanner {scanner!r}. expected one of {SCANNERS}")
         self.path = Path(path).resolve()
         self.is_directory = is_directory
+        self.jobs = jobs if jobs > 0 else (os.cpu_count() or 1)
+        self.scanner = scanner
+        self.exclude = compile_exclude_patterns(exclude)
         if is_directory and not self.path.is_dir():
             raise NotADirectoryError(f"{self.path} is not a directory.")
         self.packages = set()
+        self.file_packages: Dict[str, FrozenSet[str]] = {}
         self.distributions = set()
 
     def resolve(self):
         """Resolve installed distributions for packages used in directory."""
+        self._invalidate_if_stale()
+
         if self.is_directory:
-            for py_file in self.path.rglob("*.py"):
-                self._parse_file(py_file)
+            py_files = list(self._iter_py_files())
+            if self.jobs > 1 and len(py_files) >= PARALLEL_SCAN_THRESHOLD:
+                self._parse_files_parallel(py_files)
+            else:
+                for py_file in py_files:
+                    self._parse_file(py_file)
         else:
             self._parse_file(self.path)
 
@@ -97,18 +968,204 @@ class MoleratDistributionResolver:
 
         return sorted(self.distributions)
 
+    def resolve_by_file(self) -> Dict[str, FrozenSet[str]]:
+        """Resolve the installed distributions imported by each scanned .py file."""
+        self.resolve()
+        return {
+            file: self.distributions_for(packages)
+            for file, packages in self.file_packages.items()
+        }
+
+    @classmethod
+    def distributions_for(cls, packages) -> FrozenSet[str]:
+        """Map top-level import names to the installed distributions providing them."""
+        return frozenset(
+            dist for dist in map(cls._find_distribution_for_package, packages) if dist
+        )
+
+    def _iter_py_files(self) -> Iterator[Path]:
+        """Walk the directory for .py files, pruning excluded, hidden and virtualenv directories."""
+        pending = [str(self.path)]
+        while pending:
+            current = pending.pop()
+            try:
+                entries = os.scandir(current)
+            except OSError:
+                continue
+            with entries:
+                for entry in entries:
+                    name = entry.name
+                    if self.exclude and self.exclude.match(name):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        if (
+                            name.startswith(".")
+                            or name in PRUNED_DIRS
+                            or os.path.exists(os.path.join(entry.path, "pyvenv.cfg"))
+                        ):
+                            continue
+                        pending.append(entry.path)
+                    elif name.endswith(".py") and entry.is_file():
+                        yield Path(entry.path)
+
     def _parse_file(self, file: Path):
+        """Add the top-level package names imported by a .py file to the resolved packages."""
+        imports = self.file_imports(file, self.scanner)
+        self.file_packages[str(file)] = imports
+        self.packages.update(imports)
+
+    def _parse_files_parallel(self, files: List[Path]):
+        """Parse uncached files in chunks across a process pool, merging only their import names."""
+        stale: List[Tuple[Path, os.stat_result]] = []
+        for file in files:
+            stat = file.stat()
+            cached = self._cached_imports(file, stat)
+            if cached is None:
+                stale.append((file, stat))
+            else:
+                self.file_packages[str(file)] = cached
+                self.packages.update(cached)
+
+        if not stale:
+            return
+
+        chunk_size = -(-len(stale) // (self.jobs * 4))
+        chunks = [stale[i : i + chunk_size] for i in range(0, len(stale), chunk_size)]
+        with ProcessPoolExecutor(max_workers=min(self.jobs, len(chunks))) as pool:
+            results = pool.map(
+                _extract_imports_chunk,
+                [[str(file) for file, _ in chunk] for chunk in chunks],
+                [self.scanner] * len(chunks),
+            )
+            for chunk, chunk_imports in zip(chunks, results):
+                for (file, stat), imports in zip(chunk, chunk_imports):
+                    self._import_cache[str(file)] = (stat.st_mtime_ns, stat.st_size, imports)
+                    self.file_packages[str(file)] = imports
+                    self.packages.update(imports)
+
+    @classmethod
+    def file_imports(cls, file: Path, scanner: str = SCANNER_AST) -> FrozenSet[str]:
+        """Return a file's top-level imports, re-parsing only when its mtime or size changed."""
+        stat = file.stat()
+        cached = cls._cached_imports(file, stat)
+        if cached is not None:
+            return cached
+
+        imports = cls._extract_imports(file, scanner)
+        cls._import_cache[str(file)] = (stat.st_mtime_ns, stat.st_size, imports)
+        return imports
+
+    @classmethod
+    def _cached_imports(cls, file: Path, stat: os.stat_result) -> Optional[FrozenSet[str]]:
+        """Return the cached imports of a file if its stat signature is unchanged."""
+        cached = cls._import_cache.get(str(file))
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+        return None
+
+    @classmethod
+    def forget_file(cls, file: str):
+        """Evict a deleted file from the per-file import cache."""
+        cls._import_cache.pop(str(Path(file).resolve()), None)
+
+    @classmethod
+    def forget_tree(cls, directory: str):
+        """Evict every file under a deleted or moved directory from the per-file import cache."""
+        prefix = os.path.join(str(Path(directory).resolve()), "")
+        for path in [path for path in cls._import_cache if path.startswith(prefix)]:
+            del cls._import_cache[path]
+
+    @classmethod
+    def _extract_imports(cls, file: Path, scanner: str = SCANNER_AST) -> FrozenSet[str]:
         """Parse a .py file and extract top-level package names from import statements."""
         with file.open("r", encoding="utf-8") as f:
-            node = ast.parse(f.read(), filename=str(file))
+            source = f.read()
+
+        if scanner == SCANNER_FAST:
+            statements = cls._import_statements(source)
+            if statements is not None:
+                try:
+                    return cls._collect_imports(ast.parse("\n".join(statements)))
+                except SyntaxError:
+                    pass
+
+        return cls._collect_imports(ast.parse(source, filename=str(file)))
 
+    @staticmethod
+    def _import_statements(source: str) -> Optional[List[str]]:
+        """Cut the import statements out of a module without parsing the rest of it.
+
+        Returns None when the source has constructs the line scanner does not handle
+        (imports after ';' or ':', unterminated strings or parentheses), so the caller
+        can fall back to a full parse.
+        """
+        if "import" not in source:
+            return []
+        if _INLINE_IMPORT.search(source):
+            return None
+
+        string_spans: List[Tuple[int, int]] = []
+        pos = 0
+        while True:
+            match = _STRING_OR_COMMENT.search(source, pos)
+            if not match:
+                break
+            quote = match.group()
+            if quote not in ('"""', "'''"):
+                pos = match.end()
+                continue
+            end = match.end()
+            while True:
+                end = source.find(quote, end)
+                if end < 0:
+                    return None
+                escapes = 0
+                while source[end - 1 - escapes] == "\\":
+                    escapes += 1
+                if escapes % 2 == 0:
+                    break
+                end += 1
+            pos = end + 3
+            string_spans.append((match.start(), pos))
+
+        statements: List[str] = []
+        span_idx = 0
+        for match in _IMPORT_LINE.finditer(source):
+            start = match.start()
+            while span_idx < len(string_spans) and string_spans[span_idx][1] <= start:
+                span_idx += 1
+            if span_idx < len(string_spans) and string_spans[span_idx][0] <= start:
+                continue
+
+            end = source.find("\n", start)
+            end = len(source) if end < 0 else end
+            if "(" in source[start:end] and ")" not in source[start:end]:
+                end = source.find(")", end)
+                if end < 0:
+                    return None
+                end += 1
+            else:
+                while end < len(source) and source[start:end].rstrip().endswith("\\"):
+                    end = source.find("\n", end + 1)
+                    end = len(source) if end < 0 else end
+            statements.append(source[start:end].strip())
+
+        return statements
+
+    @staticmethod
+    def _collect_imports(node: ast.AST) -> FrozenSet[str]:
+        """Collect top-level package names from the import statements of a syntax tree."""
+        packages: Set[str] = set()
         for elem in ast.walk(node):
             if isinstance(elem, ast.Import):
-                self.packages.add(elem.names[0].name.split(".")[0])
+                for alias in elem.names:
+                    packages.add(alias.name.split(".")[0])
             elif isinstance(elem, ast.ImportFrom):
                 if elem.level == 0 and elem.module:
                     base = elem.module.split(".")[0]
-                    self.packages.add(base)
+                    packages.add(base)
+
+        return frozenset(packages)
 
     @classmethod
     def _find_distribution_for_package(cls, import_name):
@@ -116,31 +1173,300 @@ class MoleratDistributionResolver:
         if import_name in cls._cache:
             return cls._cache[import_name]
 
+        providers = cls._get_index().get(import_name)
+        if not providers:
+            dist_name = None
+        elif len(providers) == 1:
+            dist_name = providers[0]
+        else:
+            dist_name = cls._disambiguate(import_name, providers)
+
+        cls._cache[import_name] = dist_name
+        return dist_name
+
+    @classmethod
+    def _get_index(cls) -> Dict[str, List[str]]:
+        """Return the reverse {import_name: [distribution_name]} index, building it on first use."""
+        if cls._index is None:
+            with cls._index_lock:
+                if cls._index is None:
+                    cls._index = cls._load_or_build_index()
+        return cls._index
+
+    @classmethod
+    def invalidate(cls):
+        """Drop the reverse index and lookup cache, e.g. after packages were installed or removed."""
+        with cls._index_lock:
+            cls._index = None
+            cls._versions = {}
+            cls._index_fingerprint = None
+            cls._cache = {}
+
+    @classmethod
+    def _invalidate_if_stale(cls):
+        """Drop the in-memory index if distributions were installed or removed since it was built."""
+        if cls._index is not None and cls._index_fingerprint != cls._environment_fingerprint():
+            console.log("[blue][Info][/blue] installed distributions changed. rebuilding distribution index")
+            cls.invalidate()
+
+    @staticmethod
+    def _environment_fingerprint() -> str:
+        """Hash sys.path entries together with the names and mtimes of their *.dist-info directories."""
+        digest = hashlib.sha256()
+        for entry in sys.path:
+            digest.update(entry.encode("utf-8", "surrogateescape") + b"\0")
+            try:
+                with os.scandir(entry or ".") as it:
+                    dist_infos = sorted(
+                        (e.name, e.stat().st_mtime_ns)
+                        for e in it
+                        if e.name.endswith((".dist-info", ".egg-info"))
+                    )
+            except OSError:
+                continue
+            for name, mtime_ns in dist_infos:
+                digest.update(f"{name}:{mtime_ns}\0".encode("utf-8", "surrogateescape"))
+        return digest.hexdigest()
+
+    @classmethod
+    def _load_or_build_index(cls) -> Dict[str, List[str]]:
+        """Reuse the on-disk index when the environment fingerprint matches, else rebuild and persist it."""
+        fingerprint = cls._environment_fingerprint()
+        cache_file = os.path.join(CACHE_DIR, RESOLVER_CACHE_FILE)
+
+        try:
+            with open(cache_file, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            if cached.get("fingerprint") == fingerprint:
+                index, versions = cached["index"], cached["versions"]
+                cls._versions = versions
+                cls._index_fingerprint = fingerprint
+                return index
+        except (OSError, ValueError, KeyError, AttributeError, TypeError):
+            pass
+
+        index, versions = cls._build_index()
+        cls._versions = versions
+        cls._index_fingerprint = fingerprint
+
+        try:
+            ensure_cache_dir()
+            tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump({"fingerprint": fingerprint, "index": index, "versions": versions}, f)
+            os.replace(tmp_file, cache_file)
+        except OSError as e:
+            console.log(f"[yellow][Warning] could not persist distribution index to {cache_file}: {e}[/yellow]")
+
+        return index
+
+    @classmethod
+    def find_distribution_version(cls, dist_name: str) -> Optional[str]:
+        """Return the installed version of a distribution from its metadata, never importing it."""
+        cls._get_index()
+        version = cls._versions.get(dist_name)
+        if version is None:
+            try:
+                version = importlib.metadata.version(dist_name)
+            except PackageNotFoundError:
+                return None
+            cls._versions[dist_name] = version
+        return version
+
+    @classmethod
+    def _build_index(cls) -> Tuple[Dict[str, List[str]], Dict[str, str]]:
+        """Scan installed distributions once and map every top-level import name to its providers."""
+        index: Dict[str, List[str]] = {}
+        versions: Dict[str, str] = {}
+        for dist in distributions():
+            dist_name = dist.metadata["Name"]
+            if not dist_name:
+                continue
+            versions.setdefault(dist_name, dist.version)
+            for import_name in cls._top_level_names(dist):
+                providers = index.setdefault(import_name, [])
+                if dist_name not in providers:
+                    providers.append(dist_name)
+        return index, versions
+
+    @staticmethod
+    def _top_level_names(dist) -> Set[str]:
+        """Collect the top-level import names of a distribution from top_level.txt and its RECORD."""
+        names: Set[str] = set()
+
+        top_level = dist.read_text("top_level.txt")
+        if top_level:
+            names.update(line.strip().replace("/", ".").split(".")[0] for line in top_level.splitlines())
+
+        for file in dist.files or []:
+            parts = file.parts
+            if not parts or parts[0] == "..":
+                continue
+            top = parts[0]
+            if len(parts) > 1:
+                if top == "__pycache__" or top.endswith((".dist-info", ".egg-info", ".data")):
+                    continue
+                names.add(top)
+            elif top.endswith(".py"):
+                names.add(top[:-3])
+            elif top.endswith((".so", ".pyd")):
+                names.add(top.split(".")[0])
+
+        return {name for name in names if name.isidentifier()}
+
+    @staticmethod
+    def _disambiguate(import_name: str, providers: List[str]) -> Optional[str]:
+        """Pick the provider whose RECORD owns the module's origin file when several claim the name."""
         spec = importlib.util.find_spec(import_name)
         if not spec or not spec.origin:
-            cls._cache[import_name] = None
             return None
 
         package_file = Path(spec.origin).resolve()
-        is_package = package_file.is_dir()
-
-        for dist in importlib.metadata.distributions():
+        for dist_name in providers:
+            try:
+                dist = distribution(dist_name)
+            except PackageNotFoundError:
+                continue
             for file in dist.files or []:
-                file_path = (Path(dist.locate_file(file))).resolve()
+                if Path(dist.locate_file(file)).resolve() == package_file:
+                    return dist_name
 
-                if is_package and file_path == package_file:
-                    cls._cache[import_name] = dist.metadata["Name"]
-                    return dist.metadata["Name"]
+        return None
 
-                if not is_package and file_path == package_file:
-                    cls._cache[import_name] = dist.metadata["Name"]
-                    return dist.metadata["Name"]
 
-        cls._cache[import_name] = None
-        return None
+def _extract_imports_chunk(paths: List[str], scanner: str) -> List[FrozenSet[str]]:
+    """Process pool worker: return the top-level imports of each file in a chunk."""
+    return [MoleratDistributionResolver._extract_imports(Path(path), scanner) for path in paths]
+
+
+class MoleratDependencyLedger:
+    """Reference counts of the distributions imported by the files synced into one destination."""
+
+    __slots__ = ("_file_deps", "_counts", "complete", "lock")
+
+    def __init__(self):
+        self._file_deps: Dict[str, FrozenSet[str]] = {}  # {source_file: distributions}
+        self._counts: Dict[str, int] = {}  # {distribution: number of files importing it}
+        self.complete = False  # True once every synced file was counted, so zero counts can demote
+        self.lock = threading.RLock()
+
+    def set_file(self, path: str, dists: FrozenSet[str]) -> bool:
+        """Replace one file's contribution. Returns True if the set of used distributions changed."""
+        old = self._file_deps.get(path, frozenset())
+        if dists:
+            self._file_deps[path] = dists
+        else:
+            self._file_deps.pop(path, None)
+
+        changed = False
+        for dist in old - dists:
+            self._counts[dist] -= 1
+            if not self._counts[dist]:
+                del self._counts[dist]
+                changed = True
+        for dist in dists - old:
+            self._counts[dist] = self._counts.get(dist, 0) + 1
+            changed = changed or self._counts[dist] == 1
+        return changed
+
+    def remove_tree(self, directory: str) -> bool:
+        """Drop every file under directory. Returns True if the set of used distributions changed."""
+        prefix = os.path.join(directory, "")
+        changed = False
+        for path in [path for path in self._file_deps if path.startswith(prefix)]:
+            changed = self.set_file(path, frozenset()) or changed
+        return changed
+
+    def rename(self, old: str, new: str) -> bool:
+        """Move the contribution of a file, or of every file under a directory, to its new path.
+
+        Returns True if the set of used distributions changed, which only happens when the
+        move replaced files that were counted before.
+        """
+        prefix = os.path.join(old, "")
+        moved = {
+            new + path[len(old) :]: self._file_deps.pop(path)
+            for path in [path for path in self._file_deps if path == old or path.startswith(prefix)]
+        }
+        changed = False
+        for path, dists in moved.items():
+            changed = self.set_file(path, frozenset()) or changed
+            self._file_deps[path] = dists
+        return changed
+
+    def replace_source(self, source_dir: str, file_deps: Dict[str, FrozenSet[str]]) -> bool:
+        """Replace the contribution of every file of one watched source."""
+        changed = self.remove_tree(source_dir)
+        for path, dists in file_deps.items():
+            changed = self.set_file(path, dists) or changed
+        return changed
+
+    def distributions(self) -> List[str]:
+        return sorted(self._counts)
+
+
+class MoleratPyprojectWriter:
+    """Coalesce pyproject.toml updates per file and write each one once, atomically, only when it changed."""
+
+    __slots__ = ("window", "_pending", "_timers", "_lock")
+
+    def __init__(self, window: float = 0.0):
+        """window is how long (in seconds) updates to the same file are buffered before writing."""
+        self.window = window
+        self._pending: Dict[str, dict] = {}
+        self._timers: Dict[str, threading.Timer] = {}
+        self._lock = threading.RLock()
+
+    def load(self, path: str) -> dict:
+        """Return the buffered, not yet written TOML for path, or read it from disk."""
+        key = os.path.abspath(path)
+        with self._lock:
+            if key in self._pending:
+                return self._pending[key]
+        return MoleratDistributionSync._load_toml_file(path)
+
+    def submit(self, path: str, toml_obj: dict):
+        """Buffer toml_obj as the next content of path, writing it once the window elapses."""
+        key = os.path.abspath(path)
+        with self._lock:
+            self._pending[key] = toml_obj
+            if self.window <= 0:
+                self._flush_one(key)
+            elif key not in self._timers:
+                timer = threading.Timer(self.window, self.flush, args=(key,))
+                timer.daemon = True
+                self._timers[key] = timer
+                timer.start()
+
+    def flush(self, path: Optional[str] = None):
+        """Write buffered updates now, for one file or for all of them."""
+        with self._lock:
+            keys = [os.path.abspath(path)] if path else list(self._pending)
+            for key in keys:
+                timer = self._timers.pop(key, None)
+                if timer:
+                    timer.cancel()
+                self._flush_one(key)
+
+    def _flush_one(self, key: str):
+        toml_obj = self._pending.pop(key, None)
+        if toml_obj is None:
+            return
+        try:
+            if MoleratDistributionSync._load_toml_file(key) == toml_obj:
+                return
+        except (OSError, toml.TomlDecodeError):
+            pass
+        MoleratDistributionSync._update_toml_file(key, toml_obj)
+        console.log(f"[green][Success][/green] {key} updated.")
 
 
 class MoleratDistributionSync:
+    writer = MoleratPyprojectWriter()  # shared by the startup sync and every watch handler
+    _parsed_files: Dict[str, Tuple[int, int, object]] = {}  # {abs_path: (mtime_ns, size, parsed)}
+    _ledgers: Dict[str, MoleratDependencyLedger] = {}  # {abs_destination_dir: ledger}
+    lockfile: Optional[str] = None  # when set, sub-dependency versions are pinned from this uv.lock
+
     @staticmethod
     def append_to_gitignore(directory: str, cwd: str):
         """Add directory to .gitignore if it's not already present."""
@@ -162,76 +1488,312 @@ class MoleratDistributionSync:
         with open(path, "r", encoding="utf-8") as f:
             return toml.loads(f.read())
 
+    @classmethod
+    def _load_cached(cls, path: str, parse: Callable[[str], object]):
+        """Return parse(path), re-running it only when the file's mtime or size changed."""
+        key = os.path.abspath(path)
+        stat = os.stat(key)
+        cached = cls._parsed_files.get(key)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+
+        parsed = parse(key)
+        cls._parsed_files[key] = (stat.st_mtime_ns, stat.st_size, parsed)
+        return parsed
+
+    @staticmethod
+    def _parse_root_project(path: str):
+        """Load the root pyproject.toml together with its requirement index."""
+        base_toml = MoleratDistributionSync._load_toml_file(path)
+        return base_toml, MoleratDistributionSync._build_requirement_index(base_toml)
+
+    @classmethod
+    def load_root_project(cls) -> Tuple[dict, Tuple[Dict[str, List[str]], Dict[str, List[str]]]]:
+        """Return the parsed root pyproject.toml and its requirement index, cached on mtime and size."""
+        return cls._load_cached(PYPROJECT_TOML_FILE, cls._parse_root_project)
+
+    @staticmethod
+    def _parse_lockfile(path: str) -> Dict[str, List[str]]:
+        """Index a uv.lock file as {normalized package name: [locked versions]}."""
+        lock = MoleratDistributionSync._load_toml_file(path)
+        locked: Dict[str, List[str]] = {}
+        for package in lock.get("package", []):
+            name, version = package.get("name"), package.get("version")
+            if name and version:
+                versions = locked.setdefault(normalize_name(name), [])
+                if version not in versions:
+                    versions.append(version)
+        return locked
+
+    @classmethod
+    def load_locked_versions(cls) -> Optional[Dict[str, List[str]]]:
+        """Return the configured lockfile's version index, re-parsed only when the lockfile changes."""
+        if not cls.lockfile:
+            return None
+        return cls._load_cached(cls.lockfile, cls._parse_lockfile)
+
     @staticmethod
     def _update_toml_file(path, toml_obj):
-        """Save the updated TOML back to disk."""
-        with open(path, "w", encoding="utf-8") as f:
+        """Save the updated TOML back to disk, atomically replacing the old file."""
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
             f.write(toml.dumps(toml_obj))
+        os.replace(tmp_path, path)
 
     @staticmethod
-    def _find_installable_deps(used: List[str], base_toml: dict):
-        """Resolve which used deps are present in base toml and are installable or dev."""
-        installed: List[str] = base_toml.get("project", {}).get("dependencies", [])
-        dev: List[str] = base_toml.get("dependency-groups", {}).get("dev", [])
+    def _find_installable_deps(
+        used: List[str],
+        base_toml: dict,
+        requirement_index: Optional[Tuple[Dict[str, List[str]], Dict[str, List[str]]]] = None,
+        locked_versions: Optional[Dict[str, List[str]]] = None,
+    ):
+        """Resolve which used deps are present in base toml and are installable or dev.
 
-        python_sys_version = sys.version
-        python_version = re.match("^\d{1,2}\.\d{2,3}",sys.version)[0]
+        Undeclared sub-dependencies are pinned from locked_versions when given, otherwise from
+        the installed distribution metadata.
+        """
+        installed, dev = requirement_index or MoleratDistributionSync._build_requirement_index(
+            base_toml
+        )
+
+        python_version = f"{sys.version_info.major}.{sys.version_info.minor}"
         native_modules_list = native_modules_map.get(python_version)
+        native_modules = set(native_modules_list or ())
 
-        installable_without_version: List[str] = []
+        declared: Set[str] = set()
         installable: List[str] = []
-
-        for dep in used:
-            for i_dep in installed:
-                if i_dep.startswith(dep):
-                    installable.append(i_dep)
-                    installable_without_version.append(dep)
-
         installable_dev: List[str] = []
 
         for dep in used:
-            for i_dep in dev:
-                if i_dep.startswith(dep):
-                    installable_dev.append(i_dep)
+            name = normalize_name(dep)
+            if name in installed:
+                installable.extend(installed[name])
+                declared.add(dep)
+            if name in dev:
+                installable_dev.extend(dev[name])
+                declared.add(dep)
 
         native_deps: List[str] = []
         installed_sub_deps: List[Tuple[str,str]] = []
 
         if native_modules_list:
             for dep in used:
-                if dep in native_modules_list:
+                if dep in native_modules:
                     native_deps.append(dep)
-                elif dep not in installable_without_version:
-                    try:
-                        mod = importlib.import_module(dep)
-                        version = getattr(mod, "__version__", None)
-                        installed_sub_deps.append((dep,version))
-                    except (ModuleNotFoundError, Exception) as e:
-                        print(e)
+                elif dep not in declared:
+                    if locked_versions is None:
+                        version = MoleratDistributionResolver.find_distribution_version(dep)
+                    else:
+                        versions = locked_versions.get(normalize_name(dep), [])
+                        version = versions[0] if len(versions) == 1 else None
+                    if version:
+                        installed_sub_deps.append((dep, version))
+                    else:
                         console.log(f"[yellow][Warning] could not resolve dependency {dep}.[/yellow]")
-            pass
 
         return installable, installable_dev, native_deps, installed_sub_deps
 
     @staticmethod
-    def promote_dependencies(
-        watch_dir: str, destination_dir: str, is_directory: bool = True
-    ):
-        # print(f"promote_dependencies called with {watch_dir=}, {destination_dir=}, {is_directory=}")
-        """Analyze watch directory's imports and promote to destination's pyproject.toml."""
+    def _build_requirement_index(
+        base_toml: dict,
+    ) -> Tuple[Dict[str, List[str]], Dict[str, List[str]]]:
+        """Index the root project and dev requirements by their PEP 503 normalized name."""
+        indexes: Tuple[Dict[str, List[str]], Dict[str, List[str]]] = ({}, {})
+        requirement_lists = (
+            base_toml.get("project", {}).get("dependencies", []),
+            base_toml.get("dependency-groups", {}).get("dev", []),
+        )
+        for index, requirements in zip(indexes, requirement_lists):
+            for requirement in requirements:
+                if not isinstance(requirement, str):
+                    continue  # {include-group = "..."} tables carry no requirement of their own
+                match = _REQUIREMENT_NAME.match(requirement)
+                if match:
+                    index.setdefault(normalize_name(match.group(1)), []).append(requirement)
+        return indexes
+
+    @staticmethod
+    def can_promote(destination_dir: str) -> bool:
+        """Check that both the root and the destination have a pyproject.toml to promote between."""
         if not (
             os.path.exists(PYPROJECT_TOML_FILE) and os.path.isfile(PYPROJECT_TOML_FILE)
         ):
             print("root doesn't contain pyproject.toml")
-            return
+            return False
 
         workspace_pyproject = os.path.join(destination_dir, PYPROJECT_TOML_FILE)
         if not (
             os.path.exists(workspace_pyproject) and os.path.isfile(workspace_pyproject)
         ):
             print("workspace doesn't contain pyproject.toml")
+            return False
+
+        return True
+
+    @staticmethod
+    def resolve_dependencies(
+        watch_dir: str,
+        is_directory: bool = True,
+        jobs: int = 1,
+        scanner: str = SCANNER_AST,
+        exclude: Optional[List[str]] = None,
+    ) -> List[str]:
+        """Resolve the distributions used by watch_dir. The result can be promoted to any number of destinations."""
+        resolver = MoleratDistributionResolver(
+            watch_dir, is_directory, jobs=jobs, scanner=scanner, exclude=exclude
+        )
+        return resolver.resolve()
+
+    @staticmethod
+    def resolve_file_dependencies(
+        watch_dir: str,
+        jobs: int = 1,
+        scanner: str = SCANNER_AST,
+        exclude: Optional[List[str]] = None,
+    ) -> Dict[str, FrozenSet[str]]:
+        """Resolve the distributions used by each file of watch_dir, for any number of destinations."""
+        resolver = MoleratDistributionResolver(
+            watch_dir, jobs=jobs, scanner=scanner, exclude=exclude
+        )
+        return resolver.resolve_by_file()
+
+    @classmethod
+    def ledger_for(cls, destination_dir: str) -> MoleratDependencyLedger:
+        """Return the dependency reference counts of a destination."""
+        return cls._ledgers.setdefault(os.path.abspath(destination_dir), MoleratDependencyLedger())
+
+    @staticmethod
+    def file_distributions(src_path: str, scanner: str = SCANNER_AST) -> FrozenSet[str]:
+        """Resolve the installed distributions imported by a single file."""
+        path = str(Path(src_path).resolve())
+        resolver = MoleratDistributionResolver(path, is_directory=False, scanner=scanner)
+        return resolver.resolve_by_file().get(path, frozenset())
+
+    @classmethod
+    def update_file_dependencies(
+        cls,
+        src_path: str,
+        destination_dir: str,
+        scanner: str = SCANNER_AST,
+        deleted: bool = False,
+        dists: Optional[FrozenSet[str]] = None,
+    ):
+        """Update one file's contribution to a destination and re-sync its pyproject.toml if that changed the used distributions.
+
+        Pass dists from file_distributions() to reuse one resolution across destinations.
+        """
+        if deleted:
+            dists = frozenset()
+        elif dists is None:
+            dists = MoleratDistributionSync.file_distributions(src_path, scanner)
+        cls.update_batch_dependencies({src_path: dists}, destination_dir, source=src_path)
+
+    @classmethod
+    def update_batch_dependencies(
+        cls,
+        file_dists: Dict[str, FrozenSet[str]],
+        destination_dir: str,
+        source: str = "",
+        promote: bool = True,
+        moved: Sequence[Tuple[str, str]] = (),
+        removed_dirs: Sequence[str] = (),
+    ) -> bool:
+        """Apply the new distributions of several files to a destination, promoting at most once.
+
+        moved holds (old, new) renames of files or directories and removed_dirs deleted
+        directories; both are applied before file_dists. Returns whether the used
+        distributions changed. With promote=False the caller is responsible for calling
+        promote_ledger() afterwards.
+        """
+        ledger = cls.ledger_for(destination_dir)
+        with ledger.lock:
+            changed = False
+            for old, new in moved:
+                changed = ledger.rename(str(Path(old).resolve()), str(Path(new).resolve())) or changed
+            for directory in removed_dirs:
+                changed = ledger.remove_tree(str(Path(directory).resolve())) or changed
+            for src_path, dists in file_dists.items():
+                changed = ledger.set_file(str(Path(src_path).resolve()), dists) or changed
+            if not changed:
+                console.log(
+                    f"[blue][Info][/blue] used distributions of {destination_dir} are unchanged"
+                )
+                return False
+            if promote:
+                cls.promote_ledger(source, destination_dir)
+        return True
+
+    @classmethod
+    def promote_ledger(cls, source: str, destination_dir: str):
+        """Sync a destination's pyproject.toml with the distributions its ledger currently counts."""
+        ledger = cls.ledger_for(destination_dir)
+        with ledger.lock:
+            cls.promote_dependencies(
+                source,
+                destination_dir,
+                used_deps=ledger.distributions(),
+                demote=ledger.complete,
+            )
+
+    @staticmethod
+    def _demote_unused(workspace_toml: dict, used_deps: List[str]) -> List[str]:
+        """Remove requirements molerat promoted whose distribution no synced file imports anymore."""
+        extra = workspace_toml.get(MOLERAT_TABLE, {})
+        used_names = {normalize_name(dep) for dep in used_deps}
+
+        def is_unused(requirement: str) -> bool:
+            match = _REQUIREMENT_NAME.match(requirement)
+            return bool(match) and normalize_name(match.group(1)) not in used_names
+
+        demoted = [req for req in extra.get(PROMOTED_KEY, []) if is_unused(req)]
+        if demoted:
+            for requirements in (
+                workspace_toml.get("project", {}).get("dependencies"),
+                workspace_toml.get("dependency-groups", {}).get("dev"),
+            ):
+                if requirements:
+                    requirements[:] = [req for req in requirements if req not in demoted]
+            extra[PROMOTED_KEY] = [req for req in extra[PROMOTED_KEY] if req not in demoted]
+
+        sub_deps = extra.get(SUB_DEPS_KEY)
+        if sub_deps:
+            stale = [req for req in sub_deps if is_unused(req)]
+            extra[SUB_DEPS_KEY] = [req for req in sub_deps if req not in stale]
+            demoted.extend(stale)
+
+        return demoted
+
+    @staticmethod
+    def _mark_promoted(workspace_toml: dict, requirement: str):
+        """Remember that molerat added a requirement, so it may demote it later."""
+        extra = workspace_toml.setdefault(MOLERAT_TABLE, {})
+        promoted = extra.setdefault(PROMOTED_KEY, [])
+        if requirement not in promoted:
+            promoted.append(requirement)
+
+    @staticmethod
+    def promote_dependencies(
+        watch_dir: str,
+        destination_dir: str,
+        is_directory: bool = True,
+        jobs: int = 1,
+        scanner: str = SCANNER_AST,
+        exclude: Optional[List[str]] = None,
+        used_deps: Optional[List[str]] = None,
+        demote: bool = False,
+    ):
+        # print(f"promote_dependencies called with {watch_dir=}, {destination_dir=}, {is_directory=}")
+        """Analyze watch directory's imports and promote to destination's pyproject.toml.
+
+        Pass used_deps from resolve_dependencies() to reuse one resolution across destinations.
+        With demote, used_deps must be everything the destination uses: previously promoted
+        requirements that are not in it are removed.
+        """
+        if not MoleratDistributionSync.can_promote(destination_dir):
             return
 
+        workspace_pyproject = os.path.join(destination_dir, PYPROJECT_TOML_FILE)
+
         console.log(
             f"[blue][Info][/blue] Workspace/Sub-Project detected at {destination_dir}{os.path.sep}. Promoting dependencies used by {watch_dir}{os.path.sep}*.py to {workspace_pyproject}"
         )
@@ -239,14 +1801,20 @@ class MoleratDistributionSync:
             f"[blue][Info][/blue] Promoting deps from {watch_dir} to {workspace_pyproject}"
         )
 
-        resolver = MoleratDistributionResolver(watch_dir, is_directory)
-        used_deps = resolver.resolve()
+        if used_deps is None:
+            used_deps = MoleratDistributionSync.resolve_dependencies(
+                watch_dir, is_directory, jobs=jobs, scanner=scanner, exclude=exclude
+            )
 
-        base_toml = MoleratDistributionSync._load_toml_file(PYPROJECT_TOML_FILE)
-        workspace_toml = MoleratDistributionSync._load_toml_file(workspace_pyproject)
+        base_toml, requirement_index = MoleratDistributionSync.load_root_project()
+        workspace_toml = MoleratDistributionSync.writer.load(workspace_pyproject)
+        original_toml = copy.deepcopy(workspace_toml)
 
         installed, dev, native_deps, installed_subdeps = MoleratDistributionSync._find_installable_deps(
-            used_deps, base_toml
+            used_deps,
+            base_toml,
+            requirement_index,
+            MoleratDistributionSync.load_locked_versions(),
         )
 
         if installed:
@@ -258,11 +1826,13 @@ class MoleratDistributionSync:
             for dep in installed:
                 if dep not in workspace_toml["project"]["dependencies"]:
                     workspace_toml["project"]["dependencies"].append(dep)
+                    MoleratDistributionSync._mark_promoted(workspace_toml, dep)
 
             for dep_tuple in installed_subdeps:
                 dep = f"{dep_tuple[0]}=={dep_tuple[1]}"
                 if dep not in workspace_toml["project"]["dependencies"]:
                     workspace_toml["project"]["dependencies"].append(dep)
+                    MoleratDistributionSync._mark_promoted(workspace_toml, dep)
 
             console.log(
                 f"[green][Success][/green] {len(installed)} deps promoted to {workspace_pyproject}."
@@ -277,6 +1847,7 @@ class MoleratDistributionSync:
             for dep in dev:
                 if dep not in workspace_toml["dependency-groups"]["dev"]:
                     workspace_toml["dependency-groups"]["dev"].append(dep)
+                    MoleratDistributionSync._mark_promoted(workspace_toml, dep)
 
             console.log(
                 f"[green][Success][/green] {len(dev)} dev deps promoted to {workspace_pyproject}."
@@ -285,8 +1856,8 @@ class MoleratDistributionSync:
         console.log(f"[blue][Info]{len(native_deps)} native dependencies and {len(installed_subdeps)} sub-dependencies are being promoted[/blue]")
 
         if native_deps or installed_subdeps:
-            if "extra-dependencies-detected-by-molerat" not in workspace_toml:
-                workspace_toml["extra-dependencies-detected-by-molerat"] = {}
+            if MOLERAT_TABLE not in workspace_toml:
+                workspace_toml[MOLERAT_TABLE] = {}
 
             if native_deps:
                 nd_key = "native_dependencies"
@@ -297,7 +1868,7 @@ class MoleratDistributionSync:
                         workspace_toml["extra-dependencies-detected-by-molerat"][nd_key].append(dep)
 
             if installed_subdeps:
-                sd_key = "sub-deps-absent-in-base-pyproject-toml"
+                sd_key = SUB_DEPS_KEY
                 if sd_key not in workspace_toml["extra-dependencies-detected-by-molerat"]:
                     workspace_toml["extra-dependencies-detected-by-molerat"][sd_key] = []
                 for dep_tuple in installed_subdeps:
@@ -305,13 +1876,35 @@ class MoleratDistributionSync:
                     if dep not in workspace_toml["extra-dependencies-detected-by-molerat"][sd_key]:
                         workspace_toml["extra-dependencies-detected-by-molerat"][sd_key].append(dep)
 
-        MoleratDistributionSync._update_toml_file(workspace_pyproject, workspace_toml)
+        if demote:
+            demoted = MoleratDistributionSync._demote_unused(workspace_toml, used_deps)
+            if demoted:
+                console.log(
+                    f"[magenta][Demoted][/magenta] {', '.join(demoted)} no longer used by synced files of {workspace_pyproject}."
+                )
+
+        if workspace_toml == original_toml:
+            console.log(f"[blue][Info][/blue] dependencies of {workspace_pyproject} are unchanged")
+            return
+
+        MoleratDistributionSync.writer.submit(workspace_pyproject, workspace_toml)
 
 
 class MoleRatFileSync:
     config: Optional[MoleRatConfig]
     config_path: str
     no_watch: bool
+    jobs: int
+    scanner: str
+    write_delay: float
+    lockfile: Optional[str]
+    debounce: float
+    workers: int
+    queue_size: int
+    burst_threshold: int
+    poll_interval: Optional[float]
+    observers: List[Union[BaseObserver, MoleratPollingObserver]]
+    handlers: List[MoleRatFileChangeHanlder]
 
     def __init__(
         self,
@@ -319,10 +1912,29 @@ class MoleRatFileSync:
         no_watch: bool = False,
         config_path: Optional[str] = None,
         config: Optional[MoleRatConfig] = None,
+        jobs: int = 1,
+        scanner: str = SCANNER_AST,
+        write_delay: float = 0.5,
+        lockfile: Optional[str] = None,
+        debounce: float = 0.2,
+        workers: int = DEFAULT_WORKERS,
+        queue_size: int = DEFAULT_WORK_QUEUE_SIZE,
+        burst_threshold: int = DEFAULT_BURST_THRESHOLD,
     ):
         self.config_path = config_path if config_path else DEFAULT_CONFIG_PATH
         self.config = config
         self.no_watch = no_watch
+        self.jobs = jobs
+        self.scanner = scanner
+        self.write_delay = write_delay
+        self.lockfile = lockfile
+        self.debounce = debounce
+        self.observers = []
+        self.workers = workers
+        self.queue_size = queue_size
+        self.burst_threshold = burst_threshold
+        self.handlers = []
+        self._stop_event = threading.Event()
 
     def _init_config(self):
         if os.path.exists(self.config_path) and os.path.isfile(self.config_path):
@@ -340,13 +1952,22 @@ class MoleRatFileSync:
             "[cyan][Startup Sync][/cyan] copying watched folders to configured destinations"
         )
 
+        MoleratDistributionSync.lockfile = self.lockfile
+        if self.lockfile and not os.path.isfile(self.lockfile):
+            console.log(
+                f"[yellow][Warning] lockfile {self.lockfile} not found. sub-dependencies will not be pinned.[/yellow]"
+            )
+            MoleratDistributionSync.lockfile = None
+
         cwd = os.getcwd()
         sep = os.path.sep
+        promoted_destinations: Dict[str, List[str]] = {}  # {destination path: watched folders}
 
         for sync_item in self.config.sync:
             source = cwd + sep + sync_item.watch
             source_dir_name = source.split(sep)[-1]
             exclude_patterns = sync_item.exclude or []
+            file_deps: Optional[Dict[str, FrozenSet[str]]] = None  # resolved once, shared by every destination
 
             console.log(
                 f"[cyan][Startup Sync][/cyan] copying files from watched folder: {source}"
@@ -403,84 +2024,315 @@ class MoleRatFileSync:
                 )
 
                 MoleratDistributionSync.append_to_gitignore(directory, cwd)
-                MoleratDistributionSync.promote_dependencies(
-                    sync_item.watch, destination.path
+
+                if not MoleratDistributionSync.can_promote(destination.path):
+                    continue
+                if file_deps is None:
+                    file_deps = MoleratDistributionSync.resolve_file_dependencies(
+                        sync_item.watch,
+                        jobs=self.jobs,
+                        scanner=self.scanner,
+                        exclude=exclude_patterns,
+                    )
+                MoleratDistributionSync.ledger_for(destination.path).replace_source(
+                    str(Path(source).resolve()), file_deps
                 )
+                promoted_destinations.setdefault(destination.path, []).append(sync_item.watch)
 
-    def run(self):
-        console.log("[green][Init] [b]molerat[/b][/green] is starting up")
-        if not self.config:
-            self._init_config()
-        if self.config:
-            self.copy_watched_folder_to_dest()
+        # promote once every sync item feeding a destination has been counted
+        for destination_path, watched in promoted_destinations.items():
+            ledger = MoleratDistributionSync.ledger_for(destination_path)
+            ledger.complete = True
+            MoleratDistributionSync.promote_dependencies(
+                ", ".join(watched),
+                destination_path,
+                used_deps=ledger.distributions(),
+                demote=True,
+            )
 
-            if self.no_watch:
-                console.log("[cyan][Exit][/cyan] Exiting. --no-watch flag was enabled")
-                return
+        MoleratDistributionSync.writer.flush()
 
-            console.log("[cyan][Watch][/cyan] watching files for changes")
-            observers: List[BaseObserver] = []
+    def _create_watches(
+        self, pool: Optional[MoleratWorkPool] = None, inline: Optional[bool] = None
+    ) -> List[Tuple[List[MoleRatFileChangeHanlder], str]]:
+        """Build the event handlers of every unique watched folder.
 
-            cwd = os.getcwd()
-            sep = os.path.sep
+        Each handler fans its events out to every destination sharing the same exclude
+        patterns, and all handlers of a folder share one observer, so observer threads and
+        inotify watches scale with sources, not destinations.
+        """
+        destinations_by_source: Dict[str, Dict[Tuple[str, ...], List[Tuple[str, str]]]] = {}
+        cwd = os.getcwd()
+        sep = os.path.sep
 
-            for sync_item in self.config.sync:
-                source_dir = cwd + sep + sync_item.watch
-                source_dir_name = source_dir.split(sep)[-1]
+        for sync_item in self.config.sync:
+            source_dir = os.path.normpath(cwd + sep + sync_item.watch)
+            source_dir_name = source_dir.split(sep)[-1]
+            exclude = tuple(sync_item.exclude or ())
+            destinations = destinations_by_source.setdefault(source_dir, {}).setdefault(exclude, [])
 
-                for destination in sync_item.destinations:
-                    dest_path = cwd + sep + destination.path
-                    dest_dir = (
-                        f"{destination.directory}"
-                        if destination.directory
-                        else f"{source_dir_name}"
-                    )
-                    event_handler = MoleRatFileChangeHanlder(
-                        source_dir, dest_path, dest_dir
-                    )
-                    observer = Observer()
-                    observer.schedule(
-                        event_handler,
-                        source_dir,
-                        recursive=True,
-                        event_filter=[
-                            FileCreatedEvent,
-                            FileModifiedEvent,
-                            FileDeletedEvent,
-                        ],
-                    )
+            for destination in sync_item.destinations:
+                dest_path = cwd + sep + destination.path
+                dest_dir = (
+                    f"{destination.directory}"
+                    if destination.directory
+                    else f"{source_dir_name}"
+                )
+                if (dest_path, dest_dir) not in destinations:
+                    destinations.append((dest_path, dest_dir))
 
-                    observers.append(observer)
+                console.log(
+                    f"[cyan][Watch][/cyan] Watching for changes at {source_dir}. Sync setup to {dest_dir}"
+                )
 
-                    console.log(
-                        f"[cyan][Watch][/cyan] Watching for changes at {source_dir}. Sync setup to {dest_dir}"
+        return [
+            (
+                [
+                    MoleRatFileChangeHanlder(
+                        source_dir,
+                        destinations,
+                        scanner=self.scanner,
+                        debounce=self.debounce,
+                        pool=pool,
+                        exclude=list(exclude),
+                        burst_threshold=self.burst_threshold,
+                        inline=inline,
                     )
+                    for exclude, destinations in destinations_by_exclude.items()
+                ],
+                source_dir,
+            )
+            for source_dir, destinations_by_exclude in destinations_by_source.items()
+        ]
+
+    def _start_observer(
+        self, event_handlers: Sequence[FileSystemEventHandler], source_dir: str
+    ) -> Union[BaseObserver, MoleratPollingObserver]:
+        """Start the native observer of a folder, or a polling one when poll_interval is set."""
+        if self.poll_interval:
+            poller = MoleratPollingObserver(event_handlers, source_dir, self.poll_interval)
+            poller.start()
+            return poller
+
+        observer = Observer()
+        watch = observer.schedule(
+            event_handlers[0],
+            source_dir,
+            recursive=True,
+            event_filter=[
+                FileCreatedEvent,
+                FileModifiedEvent,
+                FileDeletedEvent,
+                FileMovedEvent,
+                DirCreatedEvent,
+                DirDeletedEvent,
+                DirMovedEvent,
+            ],
+        )
+        for event_handler in event_handlers[1:]:
+            observer.add_handler_for_watch(event_handler, watch)
+        observer.daemon = True
+        observer.start()
+        return observer
+
+    def _install_signal_handlers(self) -> dict:
+        """Turn SIGINT/SIGTERM into a clean shutdown. Signals can only be handled on the main thread."""
+        if threading.current_thread() is not threading.main_thread():
+            return {}
+
+        def handle(signum, frame):
+            console.log(
+                f"\n[yellow][Interrupt {signal.Signals(signum).name}][/yellow] shutting down..."
+            )
+            self.stop()
+
+        return {
+            signum: signal.signal(signum, handle)
+            for signum in (signal.SIGINT, signal.SIGTERM)
+        }
+
+    def event_counters(self) -> Dict[str, int]:
+        """Event queue counters summed over every watched folder; depth and max_depth are per queue."""
+        totals = {"events": 0, "batches": 0, "bursts": 0, "dropped": 0, "depth": 0, "max_depth": 0}
+        for event_handler in self.handlers:
+            for name, value in event_handler.queue.counters.items():
+                totals[name] = max(totals[name], value) if name == "max_depth" else totals[name] + value
+            totals["depth"] += event_handler.queue.depth
+        return totals
+
+    def stop(self):
+        """Ask a running watch() to stop its observers and return."""
+        self._stop_event.set()
+
+    def watch(self):
+        """Watch the configured folders until stop() is called or SIGINT/SIGTERM is received.
+
+        The calling thread sleeps on a stop event and wakes up every SUPERVISOR_INTERVAL
+        seconds to restart observers whose thread died.
+        """
+        console.log("[cyan][Watch][/cyan] watching files for changes")
+        MoleratDistributionSync.writer.window = self.write_delay
+        self._stop_event.clear()
+
+        pool = MoleratWorkPool(self.workers, self.queue_size) if self.workers > 0 else None
+        watches = self._create_watches(pool)
+        self.handlers = [
+            event_handler for event_handlers, _ in watches for event_handler in event_handlers
+        ]
+        for event_handler in self.handlers:
+            event_handler.start()
+        self.observers = [
+            self._start_observer(event_handlers, source_dir)
+            for event_handlers, source_dir in watches
+        ]
+        previous_handlers = self._install_signal_handlers()
+
+        try:
+            while not self._stop_event.wait(SUPERVISOR_INTERVAL):
+                self._restart_dead_observers(watches)
+        finally:
+            self._stop_observers()
+            for event_handler in self.handlers:
+                event_handler.stop()
+            self._shutdown(pool)
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
+
+    def _restart_dead_observers(self, watches: Sequence[Tuple[Sequence[FileSystemEventHandler], str]]):
+        for idx, (event_handlers, source_dir) in enumerate(watches):
+            if self.observers[idx].is_alive():
+                continue
+            console.log(
+                f"[yellow][Watch] observer for {source_dir} stopped unexpectedly. restarting[/yellow]"
+            )
+            try:
+                self.observers[idx] = self._start_observer(event_handlers, source_dir)
+            except OSError as e:
+                console.log(f"[red][Watch] could not restart observer for {source_dir}: {e}[/red]")
+
+    def _stop_observers(self):
+        for observer in self.observers:
+            observer.stop()
+        for observer in self.observers:
+            if observer.is_alive():
+                observer.join()
+
+    def _shutdown(self, pool: Optional[MoleratWorkPool]):
+        """Finish queued work and pending pyproject.toml writes once the handlers are drained."""
+        if pool:
+            pool.shutdown()
+        MoleratDistributionSync.writer.flush()
+        counters = self.event_counters()
+        console.log(
+            f"[cyan][Exit][/cyan] molerat stopped watching. {counters['events']} event(s), "
+            f"{counters['batches']} batch(es), {counters['bursts']} burst resync(s)"
+        )
 
-                for obs in observers:
-                    obs.start()
-
+    async def watch_async(self):
+        """Watch the configured folders on the running event loop until cancelled or stop() is called.
+
+        Observer threads only forward events into an asyncio.Queue. Events are coalesced on
+        the loop, and each batch is synced on an executor thread once no event arrived for
+        debounce seconds, so several MoleRatFileSync objects can share one loop.
+        """
+        console.log("[cyan][Watch][/cyan] watching files for changes")
+        loop = asyncio.get_running_loop()
+        MoleratDistributionSync.writer.window = self.write_delay
+        self._stop_event.clear()
+
+        events: asyncio.Queue = asyncio.Queue()
+        pool = MoleratWorkPool(self.workers, self.queue_size) if self.workers > 0 else None
+        watches = [
+            ([MoleratAsyncEventBridge(loop, events, handler) for handler in event_handlers], source_dir)
+            for event_handlers, source_dir in self._create_watches(pool, inline=False)
+        ]
+        self.handlers = [bridge.handler for bridges, _ in watches for bridge in bridges]
+        self.observers = [self._start_observer(bridges, source_dir) for bridges, source_dir in watches]
+        changed: List[MoleRatFileChangeHanlder] = []  # handlers with events waiting for a batch
+
+        try:
+            while not self._stop_event.is_set():
                 try:
-                    while True:
-                        continue
-                except KeyboardInterrupt:
-                    console.log(
-                        "\n[yellow][Interrupt Ctrl+C] keyboard Interrupt detected[/yellow]. shutting down..."
+                    handler, event = await asyncio.wait_for(
+                        events.get(), max(self.debounce, 0) if changed else SUPERVISOR_INTERVAL
                     )
-                    for obs in observers:
-                        obs.stop()
+                except asyncio.TimeoutError:
+                    if changed:
+                        await self._dispatch_async(changed)
+                        changed = []
+                    else:
+                        self._restart_dead_observers(watches)
+                    continue
+                handler.on_any_event(event)
+                if handler not in changed:
+                    changed.append(handler)
+        finally:
+            await loop.run_in_executor(None, self._stop_observers)
+            while not events.empty():
+                handler, event = events.get_nowait()
+                handler.on_any_event(event)
+            await self._dispatch_async(self.handlers)
+            await loop.run_in_executor(None, self._shutdown, pool)
+
+    @staticmethod
+    async def _dispatch_async(handlers: Sequence[MoleRatFileChangeHanlder]):
+        """Sync the pending batch of every handler, each on its own executor thread."""
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            *(loop.run_in_executor(None, handler.queue.dispatch) for handler in handlers)
+        )
+
+    def _sync_once(self) -> bool:
+        if not self.config:
+            self._init_config()
+        if not self.config:
+            return False
+        self.copy_watched_folder_to_dest()
+        return True
+
+    async def sync_once(self) -> bool:
+        """Load the config if needed and copy every watched folder to its destinations once.
+
+        The sync runs on an executor thread. Returns False when no config is defined.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._sync_once)
+
+    def run(self):
+        console.log("[green][Init] [b]molerat[/b][/green] is starting up")
+        if self._sync_once():
+            if self.no_watch:
+                console.log("[cyan][Exit][/cyan] Exiting. --no-watch flag was enabled")
+                return
 
-                for obs in observers:
-                    obs.join()
+            self.watch()
 
         else:
-            console.log(
-                """
+            self._log_missing_config()
+
+    async def run_async(self):
+        """Like run(), but on the running event loop. Cancel the task or call stop() to stop watching."""
+        console.log("[green][Init] [b]molerat[/b][/green] is starting up")
+        if await self.sync_once():
+            if self.no_watch:
+                console.log("[cyan][Exit][/cyan] Exiting. --no-watch flag was enabled")
+                return
+
+            await self.watch_async()
+
+        else:
+            self._log_missing_config()
+
+    @staticmethod
+    def _log_missing_config():
+        console.log(
+            """
 ❌ [bold yellow]Aborting![/bold yellow] config not defined. configure [b]molerat[/b] either by:
 1. create a molerat.json file in the project root directory
 2. expicitly pass the path of the configuration file
 3. Initialize the MoleRatFileSync object with a config object
 """
-            )
+        )
 
 
 if __name__ == "__main__":
@@ -5,9 +5,14 @@ import json
 import subprocess
 import sys
 import pytest
+from pathlib import Path
 
 from molerat.config import MoleRatConfig, Sync, Destination
-from molerat.main import MoleRatFileSync, MoleratDistributionResolver
+from molerat.main import (
+    MoleRatFileSync,
+    MoleratDistributionResolver,
+    MoleratDistributionSync,
+)
 
 
 @pytest.fixture
@@ -99,3 +104,556 @@ dependencies = []
     )
     assert "Sync Successful" in result.stdout or "Sync Successful" in result.stderr
     assert (module_a / "shared" / "util.py").exists()
+
+
+def test_distribution_index_maps_import_names():
+    MoleratDistributionResolver.invalidate()
+    index = MoleratDistributionResolver._get_index()
+    assert "toml" in index["toml"]
+    assert "pytest" in index["_pytest"]
+    assert MoleratDistributionResolver._find_distribution_for_package("toml") == "toml"
+    assert MoleratDistributionResolver._find_distribution_for_package("math") is None
+    assert MoleratDistributionResolver._get_index() is index
+
+
+def test_distribution_index_persisted_to_disk(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    MoleratDistributionResolver.invalidate()
+    index = MoleratDistributionResolver._get_index()
+    assert (tmp_path / ".molerat" / "cache" / "distribution-index.json").exists()
+
+    def fail_build():
+        raise AssertionError("index should be loaded from disk")
+
+    MoleratDistributionResolver.invalidate()
+    monkeypatch.setattr(MoleratDistributionResolver, "_build_index", staticmethod(fail_build))
+    assert MoleratDistributionResolver._get_index() == index
+
+    monkeypatch.setattr(
+        MoleratDistributionResolver, "_environment_fingerprint", staticmethod(lambda: "changed")
+    )
+    monkeypatch.setattr(MoleratDistributionResolver, "_build_index", staticmethod(lambda: ({}, {})))
+    MoleratDistributionResolver._invalidate_if_stale()
+    assert MoleratDistributionResolver._get_index() == {}
+    MoleratDistributionResolver.invalidate()
+
+
+def test_sub_dependency_versions_come_from_metadata(monkeypatch):
+    import importlib
+
+    def fail_import(name, *args, **kwargs):
+        raise AssertionError(f"{name} should not be imported")
+
+    monkeypatch.setattr(importlib, "import_module", fail_import)
+    _, _, _, sub_deps = MoleratDistributionSync._find_installable_deps(
+        ["toml", "watchdog"], {"project": {"dependencies": ["toml>=0.10"]}}
+    )
+    assert sub_deps == [("watchdog", importlib.metadata.version("watchdog"))]
+
+
+def test_file_imports_cached_until_file_changes(tmp_path, monkeypatch):
+    module = tmp_path / "mod.py"
+    module.write_text("import os, json\nfrom toml import loads\nfrom . import sibling\n")
+    assert MoleratDistributionResolver.file_imports(module) == {"os", "json", "toml"}
+
+    calls = []
+    extract = MoleratDistributionResolver._extract_imports
+    monkeypatch.setattr(
+        MoleratDistributionResolver,
+        "_extract_imports",
+        staticmethod(lambda file, *args: calls.append(file) or extract(file, *args)),
+    )
+    assert MoleratDistributionResolver.file_imports(module) == {"os", "json", "toml"}
+    assert calls == []
+
+    module.write_text("import re\n")
+    assert MoleratDistributionResolver.file_imports(module) == {"re"}
+    assert calls == [module]
+
+
+def test_parallel_resolve_matches_serial(tmp_path, monkeypatch):
+    import molerat.main
+
+    for i in range(24):
+        (tmp_path / f"mod_{i}.py").write_text(f"import toml\nimport os, mod_{i % 5}\nfrom json import loads\n")
+
+    serial = MoleratDistributionResolver(str(tmp_path))
+    serial_dists = serial.resolve()
+
+    MoleratDistributionResolver._import_cache.clear()
+    monkeypatch.setattr(molerat.main, "PARALLEL_SCAN_THRESHOLD", 0)
+    parallel = MoleratDistributionResolver(str(tmp_path), jobs=2)
+    assert parallel.resolve() == serial_dists
+    assert parallel.packages == serial.packages
+    assert len(MoleratDistributionResolver._import_cache) >= 24
+
+
+def test_fast_scanner_matches_ast_scanner(tmp_path):
+    import molerat
+
+    module = tmp_path / "tricky.py"
+    module.write_text(
+        '"""Module docstring.\n\nimport not_an_import\n"""\n'
+        "import os, json as j\n"
+        "from toml import (\n    loads,  # parsing\n    dumps,\n)\n"
+        "from . import sibling\n"
+        "from .pkg import thing\n"
+        "import xml.etree \\\n    .ElementTree\n"
+        "try:\n    import rich\nexcept ImportError:\n    pass\n"
+        "def f():\n    '''\n    from fake import thing\n    '''\n    from re import compile\n"
+        "s = 'import nope'\n"
+    )
+    expected = {"os", "json", "toml", "xml", "rich", "re"}
+    fast = MoleratDistributionResolver._extract_imports(module, "fast")
+    assert fast == MoleratDistributionResolver._extract_imports(module, "ast") == expected
+    assert MoleratDistributionResolver._import_statements(module.read_text()) is not None
+
+    for source in Path(molerat.__file__).parent.rglob("*.py"):
+        assert MoleratDistributionResolver._extract_imports(
+            source, "fast"
+        ) == MoleratDistributionResolver._extract_imports(source, "ast")
+
+
+def test_resolver_prunes_excluded_directories(tmp_path):
+    (tmp_path / "app.py").write_text("import toml\n")
+    for vendored in (".venv/lib", "node_modules/pkg", "__pycache__", "vendored", "env/lib"):
+        (tmp_path / vendored).mkdir(parents=True)
+        (tmp_path / vendored / "bogus.py").write_text("import watchdog\n")
+    (tmp_path / "env" / "pyvenv.cfg").write_text("home = /usr/bin\n")
+    (tmp_path / "skip_me.py").write_text("import rich\n")
+
+    resolver = MoleratDistributionResolver(str(tmp_path), exclude=["vendored", "skip_*.py"])
+    assert [p.name for p in resolver._iter_py_files()] == ["app.py"]
+    assert resolver.resolve() == ["toml"]
+
+
+def test_startup_sync_resolves_once_per_sync_item(temp_project, monkeypatch):
+    module_b = temp_project / "module_b"
+    module_b.mkdir()
+    (module_b / "pyproject.toml").write_text("[project]\ndependencies = []\n")
+    config = MoleRatConfig(
+        sync=[
+            Sync(
+                watch="shared",
+                destinations=[
+                    Destination(path="module_a", directory="shared"),
+                    Destination(path="module_b", directory="shared"),
+                ],
+            )
+        ]
+    )
+    calls = []
+    resolve = MoleratDistributionSync.resolve_file_dependencies
+    monkeypatch.setattr(
+        MoleratDistributionSync,
+        "resolve_file_dependencies",
+        staticmethod(lambda *args, **kwargs: calls.append(args) or resolve(*args, **kwargs)),
+    )
+    monkeypatch.chdir(temp_project)
+    MoleRatFileSync(config=config).copy_watched_folder_to_dest()
+    assert len(calls) == 1
+    assert (module_b / "shared" / "util.py").exists()
+
+
+def test_installable_deps_match_normalized_requirement_names():
+    base_toml = {
+        "project": {
+            "dependencies": [
+                "requests-toolbelt>=1.0",
+                "Typing_Extensions[all]>=4; python_version < '3.11'",
+                "typing-extensions>=4.12; python_version >= '3.11'",
+                "toml",
+            ]
+        },
+        "dependency-groups": {"dev": ["pytest>=8", {"include-group": "lint"}]},
+    }
+    installable, dev, _, sub_deps = MoleratDistributionSync._find_installable_deps(
+        ["typing_extensions", "pytest", "toml"], base_toml
+    )
+    assert installable == [
+        "Typing_Extensions[all]>=4; python_version < '3.11'",
+        "typing-extensions>=4.12; python_version >= '3.11'",
+        "toml",
+    ]
+    assert dev == ["pytest>=8"]
+    assert sub_deps == []
+
+    installable, _, _, _ = MoleratDistributionSync._find_installable_deps(["requests"], base_toml)
+    assert installable == []
+
+
+def test_pyproject_writer_coalesces_and_skips_unchanged(tmp_path):
+    from molerat.main import MoleratPyprojectWriter
+
+    pyproject = tmp_path / "pyproject.toml"
+    pyproject.write_text('[project]\ndependencies = [ "toml",]\n')
+    mtime = pyproject.stat().st_mtime_ns
+
+    writer = MoleratPyprojectWriter(window=60)
+    toml_obj = writer.load(str(pyproject))
+    writer.submit(str(pyproject), toml_obj)
+    toml_obj["project"]["dependencies"].append("rich")
+    assert writer.load(str(pyproject)) is toml_obj
+    toml_obj["project"]["dependencies"].pop()
+    writer.flush()
+    assert pyproject.stat().st_mtime_ns == mtime
+
+    toml_obj = writer.load(str(pyproject))
+    toml_obj["project"]["dependencies"].append("rich")
+    writer.submit(str(pyproject), toml_obj)
+    assert "rich" not in pyproject.read_text()
+    writer.flush()
+    assert "rich" in pyproject.read_text()
+    assert list(tmp_path.iterdir()) == [pyproject]
+
+
+def test_root_project_cached_until_file_changes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    pyproject = tmp_path / "pyproject.toml"
+    pyproject.write_text('[project]\ndependencies = ["toml>=0.10"]\n')
+
+    base_toml, (installed, _) = MoleratDistributionSync.load_root_project()
+    assert installed == {"toml": ["toml>=0.10"]}
+    assert MoleratDistributionSync.load_root_project()[0] is base_toml
+
+    pyproject.write_text('[project]\ndependencies = ["toml>=0.10", "rich"]\n')
+    base_toml, (installed, _) = MoleratDistributionSync.load_root_project()
+    assert installed == {"toml": ["toml>=0.10"], "rich": ["rich"]}
+
+
+def test_dependencies_demoted_when_no_synced_file_imports_them(tmp_path, monkeypatch):
+    import toml
+
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    (shared / "a.py").write_text("import toml\n")
+    (shared / "b.py").write_text("import rich\n")
+    module_a = tmp_path / "module_a"
+    module_a.mkdir()
+    (tmp_path / "pyproject.toml").write_text(
+        '[project]\ndependencies = ["toml>=0.10", "rich>=14", "watchdog"]\n'
+    )
+    (module_a / "pyproject.toml").write_text('[project]\ndependencies = ["watchdog"]\n')
+    config = MoleRatConfig(
+        sync=[Sync(watch="shared", destinations=[Destination(path="module_a", directory="shared")])]
+    )
+    monkeypatch.chdir(tmp_path)
+    MoleRatFileSync(config=config).copy_watched_folder_to_dest()
+
+    def dependencies():
+        return toml.loads((module_a / "pyproject.toml").read_text())["project"]["dependencies"]
+
+    assert dependencies() == ["watchdog", "rich>=14", "toml>=0.10"]
+
+    (shared / "b.py").write_text("import os\n")
+    MoleratDistributionSync.update_file_dependencies(str(shared / "b.py"), "module_a")
+    assert dependencies() == ["watchdog", "toml>=0.10"]
+
+    MoleratDistributionSync.update_file_dependencies(str(shared / "a.py"), "module_a", deleted=True)
+    assert dependencies() == ["watchdog"]
+
+
+def test_sub_dependencies_pinned_from_lockfile(tmp_path, monkeypatch):
+    lockfile = tmp_path / "uv.lock"
+    lockfile.write_text(
+        'version = 1\n\n[[package]]\nname = "Watchdog"\nversion = "5.0.0"\n\n'
+        '[[package]]\nname = "rich"\nversion = "13.0.0"\n\n'
+        '[[package]]\nname = "rich"\nversion = "14.0.0"\n'
+    )
+    monkeypatch.setattr(MoleratDistributionSync, "lockfile", str(lockfile))
+    monkeypatch.setattr(
+        MoleratDistributionResolver,
+        "find_distribution_version",
+        staticmethod(lambda name: pytest.fail("site-packages should not be probed")),
+    )
+    locked = MoleratDistributionSync.load_locked_versions()
+    assert locked == {"watchdog": ["5.0.0"], "rich": ["13.0.0", "14.0.0"]}
+    assert MoleratDistributionSync.load_locked_versions() is locked
+
+    _, _, _, sub_deps = MoleratDistributionSync._find_installable_deps(
+        ["watchdog", "rich"], {}, locked_versions=locked
+    )
+    assert sub_deps == [("watchdog", "5.0.0")]
+
+
+def wait_for(predicate, timeout=5.0):
+    import time
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return predicate()
+
+
+def test_watch_supervisor_restarts_dead_observers_and_stops(temp_project, monkeypatch):
+    import threading
+    import molerat.main
+
+    monkeypatch.setattr(molerat.main, "SUPERVISOR_INTERVAL", 0.05)
+    monkeypatch.chdir(temp_project)
+    config = MoleRatConfig(
+        sync=[Sync(watch="shared", destinations=[Destination(path="module_a", directory="shared")])]
+    )
+    sync = MoleRatFileSync(config=config)
+    sync.copy_watched_folder_to_dest()
+    watcher = threading.Thread(target=sync.watch)
+    watcher.start()
+    try:
+        assert wait_for(lambda: len(sync.observers) == 1 and sync.observers[0].is_alive())
+        dead = sync.observers[0]
+        dead.stop()
+        dead.join()
+        assert wait_for(lambda: sync.observers[0] is not dead and sync.observers[0].is_alive())
+    finally:
+        sync.stop()
+        watcher.join(5)
+    assert not watcher.is_alive()
+    assert not any(observer.is_alive() for observer in sync.observers)
+
+
+def test_one_observer_per_source_fans_out_to_destinations(temp_project, monkeypatch):
+    import threading
+    import molerat.main
+
+    monkeypatch.setattr(molerat.main, "SUPERVISOR_INTERVAL", 0.05)
+    (temp_project / "module_b").mkdir()
+    monkeypatch.chdir(temp_project)
+    config = MoleRatConfig(
+        sync=[
+            Sync(
+                watch="shared",
+                destinations=[
+                    Destination(path="module_a", directory="shared"),
+                    Destination(path="module_b", directory="shared"),
+                ],
+            )
+        ]
+    )
+    sync = MoleRatFileSync(config=config)
+    sync.copy_watched_folder_to_dest()
+    watcher = threading.Thread(target=sync.watch)
+    watcher.start()
+    try:
+        assert wait_for(lambda: len(sync.observers) == 1 and sync.observers[0].is_alive())
+        (temp_project / "shared" / "new.py").write_text("import json\n")
+        for module in ("module_a", "module_b"):
+            assert wait_for(lambda: (temp_project / module / "shared" / "new.py").exists())
+    finally:
+        sync.stop()
+        watcher.join(5)
+
+
+def test_event_queue_coalesces_events_per_path():
+    from molerat.main import EVENT_CREATED, EVENT_DELETED, EVENT_MODIFIED, MoleratEventQueue
+
+    batches = []
+    queue = MoleratEventQueue(lambda batch, operations: batches.append(batch), debounce=0.05)
+    queue.start()
+    try:
+        for _ in range(20):
+            queue.put("/src/saved.py", EVENT_MODIFIED)
+        queue.put("/src/new.py", EVENT_CREATED)
+        queue.put("/src/new.py", EVENT_MODIFIED)
+        queue.put("/src/tmp.py", EVENT_CREATED)
+        queue.put("/src/tmp.py", EVENT_DELETED)
+        queue.put("/src/gone.py", EVENT_MODIFIED)
+        queue.put("/src/gone.py", EVENT_DELETED)
+        assert wait_for(lambda: batches)
+    finally:
+        queue.stop()
+    assert batches == [
+        {
+            "/src/saved.py": EVENT_MODIFIED,
+            "/src/new.py": EVENT_CREATED,
+            "/src/gone.py": EVENT_DELETED,
+        }
+    ]
+
+
+def test_work_pool_promotions_are_single_flight_per_destination():
+    import threading
+    from molerat.main import MoleratWorkPool
+
+    pool = MoleratWorkPool(workers=2, queue_size=2)
+    release = threading.Event()
+    calls = []
+
+    def slow_promotion(tag):
+        calls.append(tag)
+        release.wait(5)
+
+    try:
+        pool.promote("/dest", lambda: slow_promotion("first"))
+        assert wait_for(lambda: calls == ["first"])
+        # queued while "first" runs: only the latest one runs afterwards
+        pool.promote("/dest", lambda: slow_promotion("second"))
+        pool.promote("/dest", lambda: slow_promotion("third"))
+        assert [pool.submit(lambda x: x * 2, i).result() for i in range(5)] == [0, 2, 4, 6, 8]
+        release.set()
+    finally:
+        pool.shutdown()
+    assert calls == ["first", "third"]
+
+
+def test_watch_mirrors_moves_and_directory_events(temp_project, monkeypatch):
+    import threading
+    import molerat.main
+
+    monkeypatch.setattr(molerat.main, "SUPERVISOR_INTERVAL", 0.05)
+    monkeypatch.chdir(temp_project)
+    config = MoleRatConfig(
+        sync=[Sync(watch="shared", destinations=[Destination(path="module_a", directory="shared")])]
+    )
+    (temp_project / "shared" / "util.py").write_text("import rich\n")
+    sync = MoleRatFileSync(config=config, debounce=0.05)
+    sync.copy_watched_folder_to_dest()
+    ledger = MoleratDistributionSync.ledger_for(str(temp_project / "module_a"))
+    promotions = []
+    monkeypatch.setattr(
+        MoleratDistributionSync, "promote_ledger", classmethod(lambda cls, *args: promotions.append(args))
+    )
+    watcher = threading.Thread(target=sync.watch)
+    watcher.start()
+    source, mirror = temp_project / "shared", temp_project / "module_a" / "shared"
+    try:
+        assert wait_for(lambda: sync.observers and sync.observers[0].is_alive())
+        (source / "util.py").rename(source / "helpers.py")
+        (source / "pkg").mkdir()
+        assert wait_for(lambda: (mirror / "helpers.py").exists() and (mirror / "pkg").is_dir())
+        assert not (mirror / "util.py").exists()
+        assert wait_for(
+            lambda: ledger._file_deps == {str((source / "helpers.py").resolve()): frozenset({"rich"})}
+        )
+
+        (source / "pkg").rename(source / "lib")
+        assert wait_for(lambda: (mirror / "lib").is_dir() and not (mirror / "pkg").exists())
+        shutil.rmtree(source / "lib")
+        assert wait_for(lambda: not (mirror / "lib").exists())
+    finally:
+        sync.stop()
+        watcher.join(5)
+    # renames and empty directories do not change the used distributions
+    assert promotions == []
+
+
+def test_handler_drops_excluded_events_and_skips_promotion_for_non_python(tmp_path, monkeypatch):
+    from watchdog.events import FileCreatedEvent
+    from molerat.main import MoleRatFileChangeHanlder
+
+    source, dest = tmp_path / "shared", tmp_path / "module_a"
+    (source / "__pycache__").mkdir(parents=True)
+    (dest / "shared").mkdir(parents=True)
+    for name in ("__pycache__/util.cpython-312.pyc", "notes.txt", "util.py"):
+        (source / name).write_text("import rich\n")
+    updates = []
+    monkeypatch.setattr(
+        MoleratDistributionSync,
+        "update_batch_dependencies",
+        classmethod(lambda cls, file_dists, *args, **kwargs: updates.append(set(file_dists))),
+    )
+    handler = MoleRatFileChangeHanlder(
+        str(source), [(str(dest), "shared")], exclude=["__pycache__", "*.pyc"]
+    )
+
+    handler.on_any_event(FileCreatedEvent(str(source / "__pycache__" / "util.cpython-312.pyc")))
+    handler.on_any_event(FileCreatedEvent(str(source / "notes.txt")))
+    assert not (dest / "shared" / "__pycache__").exists()
+    assert (dest / "shared" / "notes.txt").exists()
+    assert updates == []
+
+    handler.on_any_event(FileCreatedEvent(str(source / "util.py")))
+    assert updates == [{str(source / "util.py")}]
+
+
+def test_handler_skips_resolution_when_imports_are_unchanged(tmp_path, monkeypatch):
+    from watchdog.events import FileModifiedEvent
+    from molerat.main import MoleRatFileChangeHanlder
+
+    source, dest = tmp_path / "shared", tmp_path / "module_a"
+    source.mkdir()
+    (dest / "shared").mkdir(parents=True)
+    util = source / "util.py"
+    updates = []
+    monkeypatch.setattr(
+        MoleratDistributionSync,
+        "update_batch_dependencies",
+        classmethod(lambda cls, file_dists, *args, **kwargs: updates.append(dict(file_dists))),
+    )
+    handler = MoleRatFileChangeHanlder(str(source), [(str(dest), "shared")])
+
+    util.write_text("import rich\n\ndef f():\n    return 1\n")
+    handler.on_any_event(FileModifiedEvent(str(util)))
+    util.write_text("import rich\n\ndef f():\n    return 2  # body edit\n")
+    handler.on_any_event(FileModifiedEvent(str(util)))
+    assert (dest / "shared" / "util.py").read_text().endswith("# body edit\n")
+    assert updates == [{str(util): frozenset({"rich"})}]
+
+    util.write_text("import rich\nimport toml\n")
+    handler.on_any_event(FileModifiedEvent(str(util)))
+    assert updates[-1] == {str(util): frozenset({"rich", "toml"})}
+
+
+def test_event_burst_switches_to_one_resync(tmp_path, monkeypatch):
+    from watchdog.events import FileCreatedEvent
+    from molerat.main import MoleRatFileChangeHanlder
+
+    source, dest = tmp_path / "shared", tmp_path / "module_a"
+    (source / "pkg").mkdir(parents=True)
+    (dest / "shared" / "stale").mkdir(parents=True)
+    (dest / "shared" / "stale" / "old.py").write_text("import rich\n")
+    for i in range(30):
+        (source / "pkg" / f"mod_{i}.py").write_text("import rich\n")
+    promotions = []
+    monkeypatch.setattr(
+        MoleratDistributionSync, "promote_ledger", classmethod(lambda cls, *args: promotions.append(args))
+    )
+    handler = MoleRatFileChangeHanlder(
+        str(source), [(str(dest), "shared")], debounce=0.05, burst_threshold=10
+    )
+    batches = []
+    monkeypatch.setattr(handler.queue, "process", lambda batch, operations: batches.append(batch))
+    handler.start()
+    try:
+        for i in range(30):
+            handler.on_any_event(FileCreatedEvent(str(source / "pkg" / f"mod_{i}.py")))
+        assert wait_for(lambda: len(promotions) == 1)
+    finally:
+        handler.stop()
+
+    assert batches == []
+    assert sorted(os.listdir(dest / "shared" / "pkg")) == sorted(f"mod_{i}.py" for i in range(30))
+    assert not (dest / "shared" / "stale").exists()
+    counters = handler.queue.counters
+    assert counters["events"] == 30 and counters["bursts"] == 1 and counters["dropped"] == 30
+    assert counters["max_depth"] == 11 and handler.queue.depth == 0
+
+
+def test_run_async_syncs_changes_and_stops_on_cancel(temp_project, monkeypatch):
+    import asyncio
+
+    monkeypatch.chdir(temp_project)
+    config = MoleRatConfig(
+        sync=[Sync(watch="shared", destinations=[Destination(path="module_a", directory="shared")])]
+    )
+    sync = MoleRatFileSync(config=config, debounce=0.05)
+    copied = temp_project / "module_a" / "shared" / "new.py"
+
+    async def scenario():
+        task = asyncio.create_task(sync.run_async())
+        while not (sync.observers and sync.observers[0].is_alive()):
+            await asyncio.sleep(0.01)
+        (temp_project / "shared" / "new.py").write_text("import json\n")
+        for _ in range(500):
+            if copied.exists():
+                break
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    assert copied.exists()
+    assert not any(observer.is_alive() for observer in sync.observers)
+    assert sync.event_counters()["batches"] >= 1